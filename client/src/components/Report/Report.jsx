@@ -15,12 +15,14 @@ const Report = () => {
   const [uploadedFiles, setUploadedFiles] = useState([]); // Store multiple files for stakeholder
   const [uploadedFilenames, setUploadedFilenames] = useState([]); // Store backend filenames
   const [fileHeadersList, setFileHeadersList] = useState([]); // Store headers for each file
+  const [uploadedFileIds, setUploadedFileIds] = useState([]); // GridFS ids of the stored uploads
 
   const handleFeedbackTypeChange = (type) => {
     setFeedbackType(type);
     // Reset other states when feedback type changes
     setFileHeaders([]);
     setUploadedFilename('');
+    setUploadedFileIds([]);
     setUploadStatus(null);
     setChartUrls([]);
     if (fileInputRef.current) {
@@ -44,12 +46,14 @@ const Report = () => {
       if (invalid) throw new Error('All files must be .csv or .xlsx');
 
       let filenames = [];
+      let fileIds = [];
       let headersList = [];
       for (const file of files) {
         // Always use base filename (no folder path)
         const baseFilename = file.name.split(/[/\\]/).pop();
         const formData = new FormData();
         formData.append('file', file);
+        formData.append('feedbackType', feedbackType); // Lets the server warm the charts this view will ask for
         const uploadResponse = await fetch(API_ENDPOINTS.UPLOAD_FILE, {
           method: 'POST',
           body: formData,
@@ -60,6 +64,7 @@ const Report = () => {
         }
         const uploadData = await uploadResponse.json();
         filenames.push(baseFilename);
+        fileIds.push(uploadData.file_id);
         // Get headers for each file using base filename
         const headersResponse = await fetch(`${API_ENDPOINTS.GET_HEADERS}/${encodeURIComponent(baseFilename)}`);
         if (!headersResponse.ok) {
@@ -71,6 +76,7 @@ const Report = () => {
       }
       setUploadedFiles(files);
       setUploadedFilenames(filenames);
+      setUploadedFileIds(fileIds.every(Boolean) ? fileIds : []);
       setFileHeadersList(headersList);
       setFileHeaders(headersList[0] || []); // For UI compatibility, use first file's headers
       setUploadedFilename(filenames[0] || '');
@@ -92,6 +98,13 @@ const Report = () => {
 
   const isValid = fileHeaders.length > 0;
 
+  // Refer to the files already stored on the server instead of uploading them again
+  const appendStoredFiles = (formData) => {
+    if (!uploadedFileIds.length) return false;
+    formData.append('fileIds', JSON.stringify(uploadedFileIds));
+    return true;
+  };
+
   const handleGenerate = async (e) => {
     e.preventDefault();
     if (!isValid || (feedbackType === 'stakeholder' && uploadedFiles.length === 0) || (feedbackType === 'subject' && !fileInputRef.current.files[0])) return;
@@ -102,11 +115,12 @@ const Report = () => {
 
     try {
       const formData = new FormData();
+      const useStored = appendStoredFiles(formData);
       if (feedbackType === 'stakeholder') {
-        uploadedFiles.forEach(file => formData.append('files[]', file));
+        if (!useStored) uploadedFiles.forEach(file => formData.append('files[]', file));
         formData.append('uploadedFilenames', JSON.stringify(uploadedFilenames));
       } else {
-        formData.append('file', fileInputRef.current.files[0]);
+        if (!useStored) formData.append('file', fileInputRef.current.files[0]);
         formData.append('uploadedFilename', uploadedFilename.replace(/\.[^/.]+$/, ""));
       }
       formData.append('choice', reportType === 'fieldwise' ? "2" : "1");
@@ -151,14 +165,16 @@ const Report = () => {
     try {
         const formData = new FormData();
         
-        if (feedbackType === 'stakeholder') {
-            // For stakeholder feedback, use uploadedFiles
-            uploadedFiles.forEach(file => formData.append('file', file));
-        } else {
-            // For subject feedback, use fileInputRef.current.files
-            const files = fileInputRef.current.files;
-            for (let i = 0; i < files.length; i++) {
-                formData.append('file', files[i]);
+        if (!appendStoredFiles(formData)) {
+            if (feedbackType === 'stakeholder') {
+                // For stakeholder feedback, use uploadedFiles
+                uploadedFiles.forEach(file => formData.append('file', file));
+            } else {
+                // For subject feedback, use fileInputRef.current.files
+                const files = fileInputRef.current.files;
+                for (let i = 0; i < files.length; i++) {
+                    formData.append('file', files[i]);
+                }
             }
         }
 
@@ -199,11 +215,12 @@ const Report = () => {
 
     try {
       const formData = new FormData();
+      const useStored = appendStoredFiles(formData);
       if (feedbackType === 'stakeholder') {
-        uploadedFiles.forEach(file => formData.append('files[]', file));
+        if (!useStored) uploadedFiles.forEach(file => formData.append('files[]', file));
         formData.append('uploadedFilenames', JSON.stringify(uploadedFilenames));
       } else {
-        formData.append('file', fileInputRef.current.files[0]);
+        if (!useStored) formData.append('file', fileInputRef.current.files[0]);
         formData.append('uploadedFilename', uploadedFilename.replace(/\.[^/.]+$/, ""));
       }
       formData.append('feedbackType', feedbackType);
@@ -0,0 +1,389 @@
+"""
+Memory-aware admission control for the expensive endpoints.
+
+Before a heavy or light request starts processing it asks for a ticket. Its
+cost is estimated in MB from the upload profile (rows x Likert columns x
+report groups) or, for posted files, from the request size. The ticket is
+granted only if the class is under its concurrency limit and the box's live
+memory plus the cost of every request already running plus this one fits
+the memory budget. Otherwise the request waits up to the class's queue time
+and then gets 429 with a Retry-After header, so only memory-safe work goes
+ahead instead of the kernel killing workers.
+
+Running tickets are kept in a small JSON file in /dev/shm, locked with
+flock, so every gunicorn worker on the machine sees the same picture.
+Tickets of processes that died (e.g. OOM-killed) are dropped when the file
+is next read. Live memory is the container's working set from cgroups
+(usage minus inactive page cache) when available, otherwise the summed RSS
+of this worker and its sibling workers (psutil).
+
+Waiting requests are queued in the same file and granted in priority order:
+interactive work (uploads, chart previews) before standard reports before
+bulk jobs (per-group and multi-file reports). Within a priority, clients
+(X-Session-ID / X-Client-ID header, else the client address) with fewer
+requests already running go first, then the longest waiting, so one client
+cannot take every slot. Bulk jobs also have their own, small concurrency
+limit: each one holds a sync worker for its whole run, and capping them
+keeps workers free for interactive requests. Bulk jobs wait only briefly,
+because a waiting request holds a worker too.
+"""
+import fcntl
+import functools
+import inspect
+import json
+import os
+import tempfile
+import time
+import uuid
+
+import psutil
+
+from jobs import check_cancelled
+from metrics import ADMISSION_DECISIONS, ADMISSION_QUEUE_DEPTH, ADMISSION_RUNNING, ADMISSION_WAIT_SECONDS
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_CONTROL', '1') == '1'
+ADMISSION_STATE_FILE = os.environ.get(
+    'ADMISSION_STATE_FILE',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'feedback-catalyst-admission.json')
+)
+# Memory the app may use on this machine; 85% of the container limit (or RAM) if unset
+ADMISSION_MEMORY_MB = os.environ.get('ADMISSION_MEMORY_MB')
+ADMISSION_BYTES_PER_CELL = float(os.environ.get('ADMISSION_BYTES_PER_CELL', 64))
+# Parsed DataFrame size relative to the raw uploaded file
+ADMISSION_UPLOAD_FACTOR = float(os.environ.get('ADMISSION_UPLOAD_FACTOR', 8))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 15))
+POLL_SECONDS = 0.25
+
+ENDPOINT_CLASSES = {
+    'light': {
+        'max_concurrent': int(os.environ.get('ADMISSION_MAX_LIGHT', 8)),
+        'queue_seconds': float(os.environ.get('ADMISSION_QUEUE_LIGHT_SECONDS', 5)),
+        'base_mb': float(os.environ.get('ADMISSION_BASE_LIGHT_MB', 30)),
+    },
+    'heavy': {
+        'max_concurrent': int(os.environ.get('ADMISSION_MAX_HEAVY', 2)),
+        'queue_seconds': float(os.environ.get('ADMISSION_QUEUE_HEAVY_SECONDS', 20)),
+        'base_mb': float(os.environ.get('ADMISSION_BASE_HEAVY_MB', 80)),
+    },
+}
+
+# Scheduling order (lower rank first); max_concurrent/queue_seconds tighten the endpoint class's limits
+PRIORITIES = {
+    'interactive': {'rank': 0, 'max_concurrent': None, 'queue_seconds': None},
+    'standard': {'rank': 1, 'max_concurrent': None, 'queue_seconds': None},
+    'bulk': {
+        'rank': 2,
+        'max_concurrent': int(os.environ.get('ADMISSION_MAX_BULK', 1)),
+        'queue_seconds': float(os.environ.get('ADMISSION_QUEUE_BULK_SECONDS', 5)),
+    },
+    # Speculative work nobody is waiting for (precompute.py): runs only if admitted at once
+    'background': {
+        'rank': 3,
+        'max_concurrent': int(os.environ.get('ADMISSION_MAX_BACKGROUND', 1)),
+        'queue_seconds': 0,
+    },
+}
+# Waiting entries older than their queue time plus this are dropped as abandoned
+STALE_WAIT_SECONDS = 30
+
+MB = 1024 * 1024
+_CGROUP_V2 = '/sys/fs/cgroup'
+_CGROUP_V1 = '/sys/fs/cgroup/memory'
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, retry_after=ADMISSION_RETRY_AFTER):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return int(value) if value.isdigit() else None
+    except OSError:
+        return None
+
+
+def _cgroup_stat(path, key):
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(' ')
+                if name == key:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def memory_limit_bytes():
+    """Container memory limit if there is one, otherwise physical RAM"""
+    limit = _read_int(os.path.join(_CGROUP_V2, 'memory.max')) or _read_int(os.path.join(_CGROUP_V1, 'memory.limit_in_bytes'))
+    total = psutil.virtual_memory().total
+    # cgroup v1 reports "no limit" as a huge number
+    return min(limit, total) if limit else total
+
+
+def memory_budget_bytes():
+    if ADMISSION_MEMORY_MB:
+        return int(float(ADMISSION_MEMORY_MB) * MB)
+    return int(memory_limit_bytes() * 0.85)
+
+
+def _worker_processes():
+    """This process and its sibling gunicorn workers (or just this process when run directly)"""
+    me = psutil.Process(os.getpid())
+    try:
+        parent = me.parent()
+        if parent is not None and 'gunicorn' in ' '.join(parent.cmdline()):
+            return parent.children()
+    except psutil.Error:
+        pass
+    return [me]
+
+
+def live_memory_bytes():
+    """Working set of the container (cgroup usage minus inactive page cache), or the workers' summed RSS"""
+    usage = _read_int(os.path.join(_CGROUP_V2, 'memory.current'))
+    if usage is not None:
+        return usage - _cgroup_stat(os.path.join(_CGROUP_V2, 'memory.stat'), 'inactive_file')
+    usage = _read_int(os.path.join(_CGROUP_V1, 'memory.usage_in_bytes'))
+    if usage is not None and usage < psutil.virtual_memory().total:
+        return usage - _cgroup_stat(os.path.join(_CGROUP_V1, 'memory.stat'), 'total_inactive_file')
+    total = 0
+    for process in _worker_processes():
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue
+    return total
+
+
+def estimate_cost_mb(endpoint_class, profiles=(), choice='1', upload_bytes=0):
+    """
+    Peak memory a request is expected to add, in MB. Each stored upload costs
+    rows x Likert columns x report groups cells (groups only for per-group
+    reports); posted files are costed by size.
+    """
+    cost = ENDPOINT_CLASSES[endpoint_class]['base_mb']
+    for profile in profiles:
+        if not profile:
+            continue
+        groups = max(1, profile.get('group_count') or 1) if choice == '2' else 1
+        cells = profile.get('row_count', 0) * len(profile.get('likert_columns', [])) * groups
+        cost += cells * ADMISSION_BYTES_PER_CELL / MB
+    cost += (upload_bytes or 0) * ADMISSION_UPLOAD_FACTOR / MB
+    return round(cost, 1)
+
+
+class AdmissionController:
+    """Running tickets and waiting requests, shared by all workers through a flock'd JSON file"""
+
+    def __init__(self, state_file=ADMISSION_STATE_FILE, classes=ENDPOINT_CLASSES, priorities=PRIORITIES):
+        self.state_file = state_file
+        self.classes = classes
+        self.priorities = priorities
+
+    def _update(self, change):
+        """Run change(state) under the file lock and save what it leaves; returns its result"""
+        with open(self.state_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                now = time.time()
+                # Requests of workers that died never release their tickets or leave the queue
+                state = {
+                    'tickets': {key: t for key, t in state.get('tickets', {}).items() if psutil.pid_exists(t['pid'])},
+                    'waiting': {
+                        key: w for key, w in state.get('waiting', {}).items()
+                        if psutil.pid_exists(w['pid']) and w['expires'] > now
+                    },
+                }
+                result = change(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                self._export_depths(state)
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _export_depths(self, state):
+        for priority in self.priorities:
+            ADMISSION_QUEUE_DEPTH.labels(priority).set(sum(1 for w in state['waiting'].values() if w['priority'] == priority))
+            ADMISSION_RUNNING.labels(priority).set(sum(1 for t in state['tickets'].values() if t['priority'] == priority))
+
+    def queue_seconds(self, endpoint_class, priority):
+        limit = self.priorities[priority]['queue_seconds']
+        queue_seconds = self.classes[endpoint_class]['queue_seconds']
+        return queue_seconds if limit is None else min(queue_seconds, limit)
+
+    def _blocked(self, request, tickets, live_mb, budget_mb):
+        """Why request cannot start now, or None"""
+        running = [t for t in tickets.values() if t['class'] == request['class']]
+        if len(running) >= self.classes[request['class']]['max_concurrent']:
+            return f"{len(running)} {request['class']} requests already running"
+        limit = self.priorities[request['priority']]['max_concurrent']
+        running = [t for t in tickets.values() if t['priority'] == request['priority']]
+        if limit is not None and len(running) >= limit:
+            return f"{len(running)} {request['priority']} requests already running"
+        projected = live_mb + sum(t['cost_mb'] for t in tickets.values()) + request['cost_mb']
+        # With nothing running, one request is always let through so work can't stall forever
+        if projected > budget_mb and tickets:
+            return f"needs {request['cost_mb']:.0f} MB, projected {projected:.0f} MB of {budget_mb:.0f} MB budget"
+        return None
+
+    def _order(self, state):
+        """Waiting requests in scheduling order: priority, then the client's running requests, then arrival"""
+        running_by_client = {}
+        for ticket in state['tickets'].values():
+            running_by_client[ticket['client']] = running_by_client.get(ticket['client'], 0) + 1
+        return sorted(state['waiting'].items(), key=lambda item: (
+            self.priorities[item[1]['priority']]['rank'],
+            running_by_client.get(item[1]['client'], 0),
+            item[1]['enqueued'],
+        ))
+
+    def enqueue(self, endpoint_class, cost_mb, priority='standard', client=None):
+        waiter = uuid.uuid4().hex
+        now = time.time()
+
+        def change(state):
+            state['waiting'][waiter] = {
+                'pid': os.getpid(), 'class': endpoint_class, 'priority': priority, 'client': client,
+                'cost_mb': cost_mb, 'enqueued': now,
+                'expires': now + self.queue_seconds(endpoint_class, priority) + STALE_WAIT_SECONDS,
+            }
+        self._update(change)
+        return waiter
+
+    def try_acquire(self, waiter):
+        """
+        Turn a waiting request into a running ticket (same id) if it is the first
+        request in scheduling order that can start now; returns (granted, reason)
+        """
+        live_mb = live_memory_bytes() / MB
+        budget_mb = memory_budget_bytes() / MB
+
+        def change(state):
+            if waiter not in state['waiting']:
+                return False, "no longer queued"
+            for key, request in self._order(state):
+                reason = self._blocked(request, state['tickets'], live_mb, budget_mb)
+                if reason is None:
+                    if key != waiter:
+                        break
+                    request = state['waiting'].pop(waiter)
+                    state['tickets'][waiter] = dict(request, started=time.time())
+                    return True, None
+                if key == waiter:
+                    return False, reason
+            return False, "waiting behind requests of higher priority or from less busy clients"
+
+        return self._update(change)
+
+    def acquire(self, endpoint_class, cost_mb, priority='standard', client=None):
+        """Queue and wait up to the queue time for a ticket; returns the ticket id or raises AdmissionRejected"""
+        waiter = self.enqueue(endpoint_class, cost_mb, priority, client)
+        deadline = time.monotonic() + self.queue_seconds(endpoint_class, priority)
+        try:
+            while True:
+                granted, reason = self.try_acquire(waiter)
+                if granted:
+                    return waiter
+                if time.monotonic() >= deadline:
+                    raise AdmissionRejected(reason)
+                # A job cancelled while queued leaves the queue right away
+                check_cancelled()
+                time.sleep(POLL_SECONDS)
+        except BaseException:
+            self._update(lambda state: state['waiting'].pop(waiter, None))
+            raise
+
+    def waiting(self):
+        """Number of requests queued for admission on this machine"""
+        return self._update(lambda state: len(state['waiting']))
+
+    def release(self, ticket):
+        self._update(lambda state: state['tickets'].pop(ticket, None))
+
+    def snapshot(self):
+        state = self._update(lambda state: json.loads(json.dumps(state)))
+        tickets, waiting = state['tickets'].values(), state['waiting'].values()
+        return {
+            'budget_mb': round(memory_budget_bytes() / MB, 1),
+            'live_mb': round(live_memory_bytes() / MB, 1),
+            'reserved_mb': round(sum(t['cost_mb'] for t in tickets), 1),
+            'running': {name: sum(1 for t in tickets if t['class'] == name) for name in self.classes},
+            'running_by_priority': {name: sum(1 for t in tickets if t['priority'] == name) for name in self.priorities},
+            'waiting_by_priority': {name: sum(1 for w in waiting if w['priority'] == name) for name in self.priorities},
+            'waiting_clients': len({w['client'] for w in waiting}),
+            'limits': self.classes,
+            'priorities': self.priorities,
+        }
+
+
+controller = AdmissionController()
+
+
+def client_key():
+    """Who a request belongs to for fair queuing: an explicit session/client id, else the client address"""
+    from flask import request
+    explicit = request.headers.get('X-Session-ID') or request.headers.get('X-Client-ID')
+    if explicit:
+        return explicit[:128]
+    forwarded = request.headers.get('X-Forwarded-For')
+    return forwarded.split(',')[0].strip() if forwarded else request.remote_addr
+
+
+def admission_controlled(endpoint_class, estimate, priority='standard'):
+    """
+    Route decorator: hold a ticket of endpoint_class while the view runs, and
+    for responses generated while they are sent (chart bundles, GridFS chart
+    streams) until the body is done. A body the view already built, like a
+    send_file ZIP, does not keep the ticket while a slow client downloads it. estimate() returns the request's cost in MB; priority
+    is a priority name or a function returning one (both called inside the
+    request).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ADMISSION_ENABLED:
+                return view(*args, **kwargs)
+            from flask import jsonify, make_response
+            cost_mb = estimate()
+            request_priority = priority() if callable(priority) else priority
+            started = time.perf_counter()
+            try:
+                ticket = controller.acquire(endpoint_class, cost_mb, request_priority, client_key())
+            except AdmissionRejected as e:
+                ADMISSION_DECISIONS.labels(endpoint_class, request_priority, 'rejected').inc()
+                print(f"⛔ Rejected {request_priority} {endpoint_class} request ({cost_mb} MB): {e}")
+                response = jsonify({"error": "Server is busy, please retry shortly", "reason": str(e)})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            waited = time.perf_counter() - started
+            ADMISSION_WAIT_SECONDS.labels(endpoint_class, request_priority).observe(waited)
+            outcome = 'queued' if waited >= POLL_SECONDS else 'admitted'
+            ADMISSION_DECISIONS.labels(endpoint_class, request_priority, outcome).inc()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                controller.release(ticket)
+                raise
+            if inspect.isgenerator(response.response):
+                # The generator does its work as the server sends the body
+                response.call_on_close(lambda: controller.release(ticket))
+            else:
+                controller.release(ticket)
+            return response
+        return wrapper
+    return decorator
@@ -1,6 +1,6 @@
-from flask import Flask, request, send_file, jsonify, send_from_directory
+from flask import Flask, Response, g, request, send_file, jsonify, send_from_directory
 from flask_cors import CORS
-import os, pandas as pd
+import os
 from dotenv import load_dotenv
 import logging
 import psutil
@@ -12,19 +12,37 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
-# Updated imports to match the actual function names in feedback_processor.py
-from feedback_processor import process_feedback, process_for_charts, summarize_suggestions, generate_implementation_plan_gemini, find_common_themes_gemini, clear_chart_cache
-import matplotlib.pyplot as plt
+# The report/chart pipeline (feedback_processor: pandas, matplotlib, FPDF, Gemini) and the
+# MongoDB connection are loaded on first use, so importing the app and /health stay fast
 import re
-from database import client, db, files_collection, charts_collection, fs_files, fs_charts
+import database
+from theme_index import build_theme_index, merge_theme_indexes, format_themes_for_prompt
+from chart_cache import chart_etag, chart_cache_control, cached_chart, hot_chart, stream_chart, stream_chart_bundle, remember_chart
+from datasets import find_upload, ensure_profile, load_dataset, StoredUploadNotFound
+from uploads import stream_to_gridfs, hash_stream, UploadTooLarge, MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, UPLOAD_FORM_OVERHEAD
 from io import BytesIO
 import tempfile
 from flask import url_for  
 import zipfile
-from feedback_processor import sanitize_text
+import json
+from chart_profiles import CHART_PROFILES, DEFAULT_VIEW_PROFILE
+import metrics
+import profiling
+import admission
+from admission import admission_controlled, estimate_cost_mb
+import tracing
+import jobs
+import precompute
+from jobs import cancellable_job, check_cancelled
+from deadlines import latency_budgeted, degradations_json
+from metrics import stage
 
 
 app = Flask(__name__)
+metrics.init_app(app)
+tracing.init_app(app)
+profiling.init_app(app)
+jobs.init_app(app)
 
 # Get frontend URL from environment variable with fallback for development
 frontend_url = os.environ.get("VITE_FRONTEND_BASE_URL")
@@ -41,6 +59,16 @@ else:
 def health_check():
     return jsonify({"status": "healthy", "message": "Server is running"}), 200
 
+@app.route('/db-stats', methods=['GET'])
+def db_stats():
+    """MongoDB pool settings and checkout wait times of the worker that answers; does not connect"""
+    return jsonify(database.pool_stats())
+
+@app.route('/admission', methods=['GET'])
+def admission_stats():
+    """Memory budget, live memory and running expensive requests across all workers"""
+    return jsonify(admission.controller.snapshot())
+
 def sanitize_filename(name):
     return re.sub(r'[^A-Za-z0-9_]+', '_', name)
 
@@ -52,9 +80,135 @@ def log_memory_usage(stage=""):
     print(f"🧠 Memory usage {stage}: {memory_mb:.2f} MB")
     return memory_mb
 
+def find_stored_profile(file):
+    """Profile of an identical file that was already uploaded (matched by content hash), if any"""
+    try:
+        digest = hash_stream(file.stream)
+        doc = database.files_collection.find_one({'sha256': digest, 'profile': {'$exists': True}}, {'profile': 1})
+        return doc['profile'] if doc else None
+    except Exception as e:
+        print(f"⚠️  Could not look up stored profile: {e}")
+        return None
+
+class InvalidUploadRefs(ValueError):
+    pass
+
+def stored_upload_refs():
+    """
+    Uploads the client referred to by GridFS id or stored filename instead of posting the files again.
+    Resolved once per request (admission costing and the view share the result); raises
+    InvalidUploadRefs for malformed fileIds/storedFilenames and StoredUploadNotFound for unknown ones.
+    """
+    if 'stored_uploads' in g:
+        return g.stored_uploads
+    refs = []
+    for key, field in (('fileIds', 'file_id'), ('storedFilenames', 'filename')):
+        if request.form.get(key):
+            try:
+                values = json.loads(request.form[key])
+            except ValueError:
+                raise InvalidUploadRefs(f"{key} must be a JSON list of strings")
+            if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+                raise InvalidUploadRefs(f"{key} must be a JSON list of strings")
+            refs.extend((field, value) for value in values)
+    for key, field in (('fileId', 'file_id'), ('storedFilename', 'filename')):
+        if request.form.get(key):
+            refs.append((field, request.form[key]))
+    g.stored_uploads = [find_upload(**{field: value}) for field, value in refs]
+    return g.stored_uploads
+
+def request_cost_mb(endpoint_class):
+    """Admission cost estimate: stored uploads by their profile, posted files by size"""
+    try:
+        uploads = stored_upload_refs()
+    except Exception:
+        # The view answers 400/404 for these; costing them as nothing is fine
+        uploads = []
+    posted_bytes = (request.content_length or 0) if request.files else 0
+    return estimate_cost_mb(endpoint_class, [meta.get('profile') for meta in uploads], request.form.get('choice', '1'), posted_bytes)
+
+def upload_cost():
+    # Sized from the header alone: the upload handler rejects oversized bodies before parsing them
+    return estimate_cost_mb('light', upload_bytes=min(request.content_length or 0, MAX_UPLOAD_BYTES))
+
+def heavy_cost():
+    return request_cost_mb('heavy')
+
+def light_cost():
+    return request_cost_mb('light')
+
+def report_priority():
+    """Per-group and multi-file reports are bulk jobs; a single overall report is standard"""
+    if request.form.get('choice') == '2' or len(posted_files()) > 1:
+        return 'bulk'
+    if len(form_filenames('fileIds')) + len(form_filenames('storedFilenames')) > 1:
+        return 'bulk'
+    return 'standard'
+
+def posted_files():
+    """Files posted with the request, under any of the field names the endpoints accept"""
+    return request.files.getlist('file') + (request.files.getlist('files[]') or request.files.getlist('files'))
+
+def form_filenames(key='uploadedFilenames'):
+    try:
+        return list(json.loads(request.form[key])) if request.form.get(key) else []
+    except ValueError:
+        return []
+
+def with_degradations(zip_buffer):
+    """Add degradations.json to a report ZIP when the latency budget cut anything"""
+    doc = degradations_json()
+    if doc:
+        with zipfile.ZipFile(zip_buffer, 'a', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr('degradations.json', doc)
+        zip_buffer.seek(0)
+    return zip_buffer
+
+def build_stored_reports_zip(uploads, names, choice, feedback_type, report_type, chart_style=None):
+    """Generate reports for stored uploads one at a time and merge their PDFs into a single ZIP"""
+    from feedback_processor import process_feedback, profile_columns
+    final_zip = BytesIO()
+    with zipfile.ZipFile(final_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for idx, meta in enumerate(uploads):
+            check_cancelled()
+            name = names[idx] if idx < len(names) and names[idx] else meta['filename']
+            log_memory_usage(f"before stored file {idx + 1}")
+            try:
+                profile = ensure_profile(meta)
+                df = load_dataset(meta, profile_columns(profile, choice, include_suggestions=feedback_type == 'stakeholder'))
+                pdf_zip = process_feedback(
+                    file_bytes=df,
+                    filename=meta['filename'],
+                    choice=choice,
+                    feedback_type=feedback_type,
+                    uploaded_filename=name,
+                    report_type=report_type,
+                    profile=profile,
+                    chart_style=chart_style
+                )
+                with stage('zip'), zipfile.ZipFile(pdf_zip, 'r') as zf:
+                    for pdf_name in zf.namelist():
+                        zipf.writestr(pdf_name, zf.read(pdf_name))
+                pdf_zip.close()
+            except Exception as file_error:
+                if len(uploads) == 1:
+                    raise
+                print(f"Error processing stored file {meta['filename']}: {file_error}")
+                # Continue with other files instead of failing completely
+                continue
+            log_memory_usage(f"after stored file {idx + 1}")
+    final_zip.seek(0)
+    return final_zip
+
 # 1) Upload an Excel/CSV and store in MongoDB GridFS
 @app.route('/upload', methods=['POST'])
+@admission_controlled('light', upload_cost, 'interactive')
 def upload_file():
+    # Reject oversized bodies before the form is parsed at all
+    from feedback_processor import profile_feedback_file
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+        return jsonify({"error": f"File exceeds the {MAX_UPLOAD_MB} MB upload limit"}), 413
+
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
         
@@ -63,25 +217,57 @@ def upload_file():
         return jsonify({"error": "No file selected"}), 400
         
     try:
-        # Read file content
-        file_content = file.read()
-        
-        # Store file in GridFS
-        file_id = fs_files.put(
-            file_content,
-            filename=file.filename,
-            content_type=file.content_type
-        )
+        # Stream file into GridFS chunk by chunk, hashing and probing the header on the way
+        with stage('gridfs_put'):
+            stored = stream_to_gridfs(database.fs_files, file.stream, file.filename, file.content_type)
+        file_id = stored['file_id']
         
+        # Profile the structure once so later requests don't have to rediscover it; the
+        # file is read in chunks, and the suggestion text is indexed on the same pass
+        profile = None
+        theme_index = None
+        try:
+            file.stream.seek(0)
+            profile, theme_index = profile_feedback_file(file.stream)
+            print(f"📋 Profiled {file.filename}: {profile['row_count']} rows, {len(profile['likert_columns'])} Likert columns")
+        except Exception as profile_error:
+            print(f"⚠️  Could not profile {file.filename}: {profile_error}")
+
         # Store metadata in files collection
-        files_collection.insert_one({
+        meta = {
             'file_id': file_id,
             'filename': file.filename,
             'content_type': file.content_type,
-            'size': len(file_content)
-        })
+            'size': stored['size'],
+            'sha256': stored['sha256'],
+            'format': stored['format'],
+            'headers': profile['headers'] if profile else stored['headers'],
+            **({'profile': profile} if profile else {})
+        }
+        database.files_collection.insert_one(meta)
+
+        # Index the suggestion text next to the stored file for /themes
+        if theme_index is not None:
+            try:
+                database.themes_collection.insert_one({
+                    'file_id': file_id,
+                    'filename': file.filename,
+                    'suggestion_column': profile['suggestion_column'],
+                    **theme_index
+                })
+                print(f"🔑 Indexed {theme_index['responses']} suggestions for {file.filename}")
+            except Exception as index_error:
+                print(f"⚠️  Could not index suggestions for {file.filename}: {index_error}")
+
+        # Optionally warm the chart and dataset caches while the user picks report options
+        precompute_job_id = precompute.schedule(meta, request.form.get('feedbackType'))
         
-        return jsonify({"filename": file.filename})
+        response = {"filename": file.filename, "file_id": str(file_id), "size": stored['size'], "sha256": stored['sha256']}
+        if precompute_job_id:
+            response['precompute_job_id'] = precompute_job_id
+        return jsonify(response)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -96,23 +282,29 @@ def get_headers(filename):
         print(f"🔍 Looking for file: '{decoded_filename}'")
         
         # Find file in GridFS - try exact match first, then search for files ending with the filename
-        file_doc = fs_files.find_one({"filename": decoded_filename})
+        file_doc = database.fs_files.find_one({"filename": decoded_filename})
         
         if not file_doc:
-            # Search for files that end with the requested filename
-            all_files = list(fs_files.find())
-            matching_files = [f for f in all_files if f.filename.endswith(decoded_filename)]
+            # Search for files that end with the requested filename: an anchored
+            # prefix match on the indexed reversed filename
+            suffix_pattern = '^' + re.escape(decoded_filename[::-1])
+            file_doc = database.fs_files.find_one({"reversed_filename": {"$regex": suffix_pattern}})
             
-            if matching_files:
-                file_doc = matching_files[0]
+            if file_doc:
                 print(f"✅ Found file with path: {file_doc.filename}")
             else:
-                print(f"❌ File not found. Available files: {[f.filename for f in all_files]}")
+                print(f"❌ File not found: {decoded_filename}")
                 return jsonify({"error": "File not found"}), 404
         else:
             print(f"✅ File found: {decoded_filename}")
+
+        # Headers come straight from the upload profile when we have one
+        meta = database.files_collection.find_one({'file_id': file_doc._id, 'profile': {'$exists': True}}, {'profile': 1})
+        if meta:
+            return jsonify({"headers": meta['profile']['headers'], "profile": meta['profile']})
         
         # Read file content
+        import pandas as pd
         file_content = file_doc.read()
         
         # Create pandas DataFrame
@@ -126,14 +318,56 @@ def get_headers(filename):
         print(f"❌ Error in get_headers: {e}")
         return jsonify({"error": str(e)}), 500
 
+def latest_theme_indexes(filenames, with_postings=False):
+    """Stored suggestion sketches by filename; the newest wins when a filename was uploaded more than once"""
+    projection = None if with_postings else {'postings': 0}
+    indexes = {}
+    for doc in database.themes_collection.find({'filename': {'$in': list(filenames)}}, projection).sort('_id', -1):
+        indexes.setdefault(doc['filename'], doc)
+    return indexes
+
+# Cross-file themes from the stored suggestion indexes
+@app.route('/themes', methods=['GET'])
+def get_themes():
+    filenames = request.args.getlist('filename')
+    phrase = request.args.get('phrase')
+    top = request.args.get('top', 25, type=int)
+
+    if not filenames:
+        return jsonify({"error": "Missing filename"}), 400
+
+    try:
+        indexes = latest_theme_indexes(filenames, with_postings=bool(phrase))
+        found = [name for name in filenames if name in indexes]
+        result = {
+            "files": found,
+            "missing": [name for name in filenames if name not in indexes],
+            "themes": merge_theme_indexes([indexes[name] for name in found], top=top)
+        }
+        if phrase:
+            phrase = " ".join(phrase.lower().split())
+            result["matches"] = {
+                name: next((rows for term, rows in indexes[name].get('postings', []) if term == phrase), [])
+                for name in found
+            }
+        return jsonify(result)
+    except Exception as e:
+        print(f"❌ Error in get_themes: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # 3) Generate the report ZIP using the file from MongoDB + choice + feedback type
 @app.route('/generate-report', methods=['POST'])
+@cancellable_job
+@latency_budgeted
+@admission_controlled('heavy', heavy_cost, report_priority)
 def generate_report():
+    from feedback_processor import process_feedback, CHART_STYLES
     feedback_type = request.form.get('feedbackType', 'stakeholder')
     choice = request.form.get('choice')
     report_type = request.form.get('reportType', None)
     uploaded_filenames = request.form.get('uploadedFilenames', None)
     uploaded_filename = request.form.get('uploadedFilename', None)
+    chart_style = request.form.get('chartStyle') or None
 
     if not choice:
         return jsonify({"error": "Missing choice"}), 400
@@ -144,7 +378,21 @@ def generate_report():
     if feedback_type not in ['stakeholder', 'subject']:
         return jsonify({"error": "Invalid feedback type"}), 400
 
+    if chart_style and chart_style not in CHART_STYLES:
+        return jsonify({"error": "Invalid chart style"}), 400
+
     try:
+        stored_uploads = stored_upload_refs()
+        if stored_uploads:
+            # Files already in GridFS: no need to upload them again
+            names = form_filenames() if feedback_type == 'stakeholder' else [uploaded_filename]
+            return send_file(
+                with_degradations(build_stored_reports_zip(stored_uploads, names, choice, feedback_type, report_type, chart_style)),
+                as_attachment=True,
+                download_name='feedback_reports.zip',
+                mimetype='application/zip'
+            )
+
         if feedback_type == 'stakeholder' and 'files[]' in request.files:
             files = request.files.getlist('files[]')
             filenames = []
@@ -158,6 +406,7 @@ def generate_report():
             final_zip = BytesIO()
             with zipfile.ZipFile(final_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 for idx, file in enumerate(files):
+                    check_cancelled()
                     fname = filenames[idx] if idx < len(filenames) else file.filename
                     try:
                         pdf_zip = process_feedback(
@@ -166,10 +415,12 @@ def generate_report():
                             choice=choice,
                             feedback_type=feedback_type,
                             uploaded_filename=fname,
-                            report_type=report_type
+                            report_type=report_type,
+                            profile=find_stored_profile(file),
+                            chart_style=chart_style
                         )
                         # Extract PDFs from this zip and add to final zip immediately
-                        with zipfile.ZipFile(pdf_zip, 'r') as zf:
+                        with stage('zip'), zipfile.ZipFile(pdf_zip, 'r') as zf:
                             for name in zf.namelist():
                                 pdf_data = zf.read(name)
                                 zipf.writestr(name, pdf_data)
@@ -186,7 +437,7 @@ def generate_report():
             
             final_zip.seek(0)
             return send_file(
-                final_zip,
+                with_degradations(final_zip),
                 as_attachment=True,
                 download_name='feedback_reports.zip',
                 mimetype='application/zip'
@@ -202,19 +453,29 @@ def generate_report():
                 choice=choice,
                 feedback_type=feedback_type,
                 uploaded_filename=uploaded_filename,
-                report_type=report_type
+                report_type=report_type,
+                profile=find_stored_profile(file),
+                chart_style=chart_style
             )
             return send_file(
-                zip_buffer,
+                with_degradations(zip_buffer),
                 as_attachment=True,
                 download_name='feedback_reports.zip',
                 mimetype='application/zip'
             )
+    except InvalidUploadRefs as e:
+        return jsonify({"error": str(e)}), 400
+    except StoredUploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/generate-stakeholder-report', methods=['POST'])
+@cancellable_job
+@latency_budgeted
+@admission_controlled('heavy', heavy_cost, report_priority)
 def generate_stakeholder_report():
+    from feedback_processor import process_feedback, CHART_STYLES
     print("Starting stakeholder report generation...")
     log_memory_usage("at start")
     files = request.files.getlist('file')  # Accept multiple files
@@ -222,14 +483,29 @@ def generate_stakeholder_report():
     choice = request.form.get('choice')
     report_type = request.form.get('reportType', None)
     uploaded_filenames = request.form.get('uploadedFilenames', None)
+    chart_style = request.form.get('chartStyle') or None
     feedback_type = 'stakeholder'
 
     if not choice:
         return jsonify({"error": "Missing choice"}), 400
     if choice not in ['1', '2']:
         return jsonify({"error": "Invalid choice parameter"}), 400
+    if chart_style and chart_style not in CHART_STYLES:
+        return jsonify({"error": "Invalid chart style"}), 400
 
     try:
+        stored_uploads = stored_upload_refs()
+        if stored_uploads:
+            print(f"Processing {len(stored_uploads)} stored files...")
+            final_zip = build_stored_reports_zip(stored_uploads, form_filenames(), choice, feedback_type, report_type, chart_style)
+            log_memory_usage("at completion")
+            return send_file(
+                with_degradations(final_zip),
+                as_attachment=True,
+                download_name='feedback_reports.zip',
+                mimetype='application/zip'
+            )
+
         if 'files[]' in request.files or 'files' in request.files:
             files = request.files.getlist('files[]') or request.files.getlist('files')
             filenames = []
@@ -245,6 +521,7 @@ def generate_stakeholder_report():
             
             with zipfile.ZipFile(final_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
                 for idx, file in enumerate(files):
+                    check_cancelled()
                     print(f"Processing file {idx + 1}/{len(files)}: {file.filename}")
                     log_memory_usage(f"before file {idx + 1}")
                     fname = filenames[idx] if idx < len(filenames) else file.filename
@@ -256,12 +533,14 @@ def generate_stakeholder_report():
                             choice=choice,
                             feedback_type=feedback_type,
                             uploaded_filename=fname,
-                            report_type=report_type
+                            report_type=report_type,
+                            profile=find_stored_profile(file),
+                            chart_style=chart_style
                         )
                         print(f"File {idx + 1} processed successfully")
                         
                         # Extract and add PDFs to final zip immediately to save memory
-                        with zipfile.ZipFile(pdf_zip, 'r') as zf:
+                        with stage('zip'), zipfile.ZipFile(pdf_zip, 'r') as zf:
                             for name in zf.namelist():
                                 pdf_data = zf.read(name)
                                 zipf.writestr(name, pdf_data)
@@ -281,27 +560,42 @@ def generate_stakeholder_report():
             log_memory_usage("at completion")
             print("Report generation completed successfully")
             return send_file(
-                final_zip,
+                with_degradations(final_zip),
                 as_attachment=True,
                 download_name='feedback_reports.zip',
                 mimetype='application/zip'
             )
         else:
             return jsonify({"error": "No files uploaded"}), 400
+    except InvalidUploadRefs as e:
+        return jsonify({"error": str(e)}), 400
+    except StoredUploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         print(f"Error in stakeholder report generation: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/generate-charts', methods=['POST'])
+@admission_controlled('light', light_cost, 'interactive')
 def generate_charts():
+    from feedback_processor import process_for_charts, profile_columns
     files = request.files.getlist('file')  # Accept multiple files
     print(f"Received files for chart generation", files)  # Add logging
     choice = request.form.get('choice')
     feedback_type = request.form.get('feedbackType', 'stakeholder')
     uploaded_filename = request.form.get('uploadedFilename', None)
     report_type = request.form.get('reportType', None)
+    bundle = request.form.get('bundle')
+    chart_profile = request.form.get('chartProfile') or None
 
-    if not files or not choice:
+    try:
+        stored_uploads = stored_upload_refs()
+    except InvalidUploadRefs as e:
+        return jsonify({"error": str(e)}), 400
+    except StoredUploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
+
+    if (not files and not stored_uploads) or not choice:
         return jsonify({"error": "Missing file(s) or choice"}), 400
 
     if choice not in ['1', '2']:
@@ -310,21 +604,42 @@ def generate_charts():
     if feedback_type not in ['stakeholder', 'subject']:
         return jsonify({"error": "Invalid feedback type"}), 400
 
+    if chart_profile and chart_profile not in CHART_PROFILES:
+        return jsonify({"error": "Invalid chart profile"}), 400
+
     chart_urls = []
+    chart_filenames_all = []
     tmp_paths = []
 
     try:
-        if feedback_type == 'stakeholder':
+        if stored_uploads:
+            if feedback_type == 'subject' and len(stored_uploads) > 1:
+                return jsonify({"error": "Only one file allowed for 'subject' feedback"}), 400
+            for meta in stored_uploads:
+                profile = ensure_profile(meta)
+                df = load_dataset(meta, profile_columns(profile, choice, include_suggestions=False))
+                chart_name = meta['filename'] if feedback_type == 'stakeholder' else uploaded_filename
+                chart_filenames = process_for_charts(
+                    df, choice, feedback_type, chart_name, report_type, profile=profile, chart_profile=chart_profile
+                )
+                chart_filenames_all.extend(chart_filenames)
+                chart_urls.extend([
+                    url_for('get_chart', filename=filename, _external=True)
+                    for filename in chart_filenames
+                ])
+        elif feedback_type == 'stakeholder':
             for file in files:
+                profile = find_stored_profile(file)
                 with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
                     tmp_path = tmp_file.name
                     file.save(tmp_path)
                     tmp_paths.append(tmp_path)
 
                 chart_filenames = process_for_charts(
-                    tmp_path, choice, feedback_type, file.filename, report_type
+                    tmp_path, choice, feedback_type, file.filename, report_type, profile=profile, chart_profile=chart_profile
                 )
 
+                chart_filenames_all.extend(chart_filenames)
                 chart_urls.extend([
                     url_for('get_chart', filename=filename, _external=True)
                     for filename in chart_filenames
@@ -334,20 +649,26 @@ def generate_charts():
                 return jsonify({"error": "Only one file allowed for 'subject' feedback"}), 400
 
             file = files[0]
+            profile = find_stored_profile(file)
             with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
                 tmp_path = tmp_file.name
                 file.save(tmp_path)
                 tmp_paths.append(tmp_path)
 
             chart_filenames = process_for_charts(
-                tmp_path, choice, feedback_type, uploaded_filename, report_type
+                tmp_path, choice, feedback_type, uploaded_filename, report_type, profile=profile, chart_profile=chart_profile
             )
 
+            chart_filenames_all.extend(chart_filenames)
             chart_urls.extend([
                 url_for('get_chart', filename=filename, _external=True)
                 for filename in chart_filenames
             ])
 
+        # Bundle mode: every chart of this generation in one streamed ZIP
+        if bundle == 'zip':
+            return chart_bundle_response(chart_filenames_all)
+
         return jsonify({
             "chart_urls": chart_urls,
             "total_charts": len(chart_urls)
@@ -363,69 +684,220 @@ def generate_charts():
                 os.unlink(path)
 
 
+@app.route('/chart-data', methods=['POST'])
+@admission_controlled('light', light_cost, 'interactive')
+def get_chart_data():
+    """Summary tables behind the chart view as JSON, for drawing the charts in the browser"""
+    from feedback_processor import iter_chart_summaries, chart_data, read_feedback_file, profile_columns, build_chart_spec, save_chart_specs
+    files = request.files.getlist('file')
+    choice = request.form.get('choice', '1')
+    feedback_type = request.form.get('feedbackType', 'stakeholder')
+    uploaded_filename = request.form.get('uploadedFilename', None)
+    report_type = request.form.get('reportType', None)
+    chart_profile = request.form.get('chartProfile') or DEFAULT_VIEW_PROFILE
+
+    if choice not in ['1', '2']:
+        return jsonify({"error": "Invalid choice parameter"}), 400
+
+    if feedback_type not in ['stakeholder', 'subject']:
+        return jsonify({"error": "Invalid feedback type"}), 400
+
+    if chart_profile not in CHART_PROFILES:
+        return jsonify({"error": "Invalid chart profile"}), 400
+
+    try:
+        # (DataFrame, chart name, profile) per file, parsing only the chart columns when profiled
+        sources = []
+        for meta in stored_upload_refs():
+            profile = ensure_profile(meta)
+            df = load_dataset(meta, profile_columns(profile, choice, include_suggestions=False))
+            sources.append((df, meta['filename'], profile))
+        for file in files:
+            profile = find_stored_profile(file)
+            df = read_feedback_file(file.stream, profile_columns(profile, choice, include_suggestions=False) if profile else None)
+            sources.append((df, file.filename, profile))
+
+        if not sources:
+            return jsonify({"error": "Missing file(s)"}), 400
+        if feedback_type == 'subject' and len(sources) > 1:
+            return jsonify({"error": "Only one file allowed for 'subject' feedback"}), 400
+
+        charts = []
+        specs = []
+        for df, name, profile in sources:
+            chart_name = name if feedback_type == 'stakeholder' else uploaded_filename
+            for category, title, summary_df in iter_chart_summaries(df, choice, feedback_type, chart_name, report_type, profile):
+                # Saved like /generate-charts' lazy charts, so GET /charts/<filename> can render the PNG
+                spec = build_chart_spec(summary_df, category, title, feedback_type, chart_profile)
+                specs.append(spec)
+                charts.append(chart_data(summary_df, category, title, feedback_type, spec['filename']))
+        save_chart_specs(specs)
+
+        return jsonify({"charts": charts, "total_charts": len(charts)})
+    except InvalidUploadRefs as e:
+        return jsonify({"error": str(e)}), 400
+    except StoredUploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print(f"Error in get_chart_data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def chart_bundle_response(filenames):
+    # URLs are resolved now because the ZIP is produced after the request context is gone
+    from feedback_processor import render_missing_charts
+    urls = {name: url_for('get_chart', filename=name, _external=True) for name in filenames}
+    render_missing_charts(filenames)
+    return Response(
+        stream_chart_bundle(database.fs_charts, filenames, urls.get),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=charts.zip'}
+    )
+
+@app.route('/charts/bundle', methods=['POST'])
+@admission_controlled('light', light_cost, 'interactive')
+def get_chart_bundle():
+    """Several charts in one ZIP response, e.g. all charts returned by one /generate-charts call"""
+    data = request.get_json(silent=True)
+    filenames = (data.get('filenames') if isinstance(data, dict) else None) or request.form.getlist('filenames')
+    if not filenames:
+        return jsonify({"error": "Missing filenames"}), 400
+    if not isinstance(filenames, list) or not all(isinstance(name, str) and name for name in filenames):
+        return jsonify({"error": "filenames must be a list of chart filenames"}), 400
+    try:
+        return chart_bundle_response(filenames)
+    except Exception as e:
+        print(f"Error in get_chart_bundle: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def render_cost():
+    return estimate_cost_mb('light')
+
+@admission_controlled('light', render_cost, 'interactive')
+def render_chart_response(filename):
+    """Render a lazily generated chart from its spec; only this path of GET /charts/<filename> needs a ticket"""
+    from feedback_processor import render_chart_from_spec
+    rendered = render_chart_from_spec(filename)
+    if not rendered:
+        print(f"Chart not found for filename: {filename}")  # Add logging
+        return jsonify({"error": "Chart not found"}), 404
+    chart_id, png_bytes = rendered
+    remember_chart(filename, str(chart_id), png_bytes)
+    response = Response(png_bytes, mimetype='image/png', headers={'Cache-Control': chart_cache_control(filename)})
+    response.set_etag(str(chart_id))
+    return response
+
 @app.route('/charts/<filename>')
 def get_chart(filename):
     try:
         print(f"Looking for chart with filename: {filename}")  # Add logging
-        
-        # Find chart in GridFS by filename
-        chart_doc = fs_charts.find_one({"filename": filename})
+
+        # Content-addressed chart this worker served recently: answer without touching MongoDB
+        hot = hot_chart(filename)
+        if hot is not None:
+            headers = {'Cache-Control': chart_cache_control(filename)}
+            if request.if_none_match.contains(hot['etag']):
+                response = Response(status=304, headers=headers)
+            else:
+                response = Response(hot['data'], mimetype='image/png', headers=headers)
+            response.set_etag(hot['etag'])
+            return response
+
+        # Find the newest version of the chart in GridFS (metadata only, no chunks yet)
+        chart_doc = next(iter(database.fs_charts.find({"filename": filename}).sort([('uploadDate', -1), ('_id', -1)]).limit(1)), None)
         if not chart_doc:
-            print(f"Chart not found for filename: {filename}")  # Add logging
-            return jsonify({"error": "Chart not found"}), 404
-            
-        print(f"Found chart for filename: {filename}")  # Add logging
-        
-        # Return chart content
-        return send_file(
-            BytesIO(chart_doc.read()),
-            mimetype='image/png',
-            as_attachment=False
-        )
+            # Lazily generated chart that nobody has viewed yet: render it from its spec now
+            return render_chart_response(filename)
+
+        etag = chart_etag(chart_doc)
+        headers = {'Cache-Control': chart_cache_control(filename)}
+
+        # Browser already has this version
+        if request.if_none_match.contains(etag):
+            chart_doc.close()
+            response = Response(status=304, headers=headers)
+        else:
+            data = cached_chart(filename, etag)
+            if data is not None:
+                chart_doc.close()
+                response = Response(data, mimetype='image/png', headers=headers)
+            else:
+                # Stream chunk by chunk instead of reading the whole PNG into memory
+                response = Response(stream_chart(chart_doc, filename, etag), mimetype='image/png', headers=headers)
+                response.content_length = chart_doc.length
+
+        response.set_etag(etag)
+        response.last_modified = chart_doc.upload_date
+        return response
     except Exception as e:
         print(f"Error in get_chart: {str(e)}")  # Add logging
         return jsonify({"error": str(e)}), 500
 
-from fpdf import FPDF
-import pandas as pd
-from io import BytesIO
-
 @app.route('/get-suggestions', methods=['POST'])
+@cancellable_job
+@admission_controlled('heavy', heavy_cost, 'standard')
 def get_suggestions():
+    import pandas as pd
+    from fpdf import FPDF
+    from feedback_processor import summarize_suggestions, generate_implementation_plan_gemini, find_common_themes_gemini, sanitize_text
     feedback_type = request.form.get('feedbackType', 'stakeholder')
     suggestions = []
+    theme_indexes = []
 
     try:
-        if feedback_type == 'stakeholder' and 'files[]' in request.files:
+        stored_uploads = stored_upload_refs()
+
+        def stored_suggestion_frames():
+            # Only the suggestion column of each stored upload is parsed; the theme
+            # sketch indexed at upload time is reused instead of being rebuilt
+            sketches = latest_theme_indexes(meta['filename'] for meta in stored_uploads)
+            for meta in stored_uploads:
+                profile = ensure_profile(meta)
+                columns = [profile['suggestion_column']] if profile['suggestion_column'] else []
+                yield load_dataset(meta, columns), sketches.get(meta['filename'])
+
+        if feedback_type == 'stakeholder' and (stored_uploads or 'files[]' in request.files):
             # Stakeholder: Multiple files
-            files = request.files.getlist('files[]')
-            filenames = request.form.get('uploadedFilenames')
-            filenames = eval(filenames) if filenames else [f.filename for f in files]
+            if stored_uploads:
+                frames = stored_suggestion_frames()
+                filenames = form_filenames() or [meta['filename'] for meta in stored_uploads]
+            else:
+                files = request.files.getlist('files[]')
+                frames = ((pd.read_excel(file) if file.filename.lower().endswith('.xlsx') else pd.read_csv(file), None) for file in files)
+                filenames = request.form.get('uploadedFilenames')
+                filenames = eval(filenames) if filenames else [f.filename for f in files]
 
-            for idx, file in enumerate(files):
-                df = pd.read_excel(file) if file.filename.lower().endswith('.xlsx') else pd.read_csv(file)
+            for idx, (df, sketch) in enumerate(frames):
+                check_cancelled()
                 suggestion_col = next((col for col in df.columns if 'suggestion' in col.lower()), None)
                 if suggestion_col:
                     summary = summarize_suggestions(df, suggestion_col)
                     suggestions.append((filenames[idx], summary))
+                    theme_indexes.append(sketch or build_theme_index(df[suggestion_col].tolist()))
 
             # Get common themes and implementation plan using Mistral (updated function names)
             all_summary_texts = [summary for _, summary in suggestions]
             common_themes = find_common_themes_gemini(all_summary_texts)
-            implementation_plan = generate_implementation_plan_gemini(common_themes)
+            keyword_themes = format_themes_for_prompt(merge_theme_indexes(theme_indexes))
+            implementation_plan = generate_implementation_plan_gemini(common_themes, keyword_themes)
 
         else:
             # Single file upload (non-stakeholder or fallback)
-            file = request.files.get('file')
-            filename = request.form.get('uploadedFilename', file.filename)
-            df = pd.read_excel(file) if file.filename.lower().endswith('.xlsx') else pd.read_csv(file)
+            if stored_uploads:
+                filename = request.form.get('uploadedFilename', stored_uploads[0]['filename'])
+                df, sketch = next(stored_suggestion_frames())
+            else:
+                sketch = None
+                file = request.files.get('file')
+                filename = request.form.get('uploadedFilename', file.filename)
+                df = pd.read_excel(file) if file.filename.lower().endswith('.xlsx') else pd.read_csv(file)
             suggestion_col = next((col for col in df.columns if 'suggestion' in col.lower()), None)
             if suggestion_col:
                 summary = summarize_suggestions(df, suggestion_col)
                 suggestions.append((filename, summary))
 
                 # Generate implementation plan even for single summary (updated function name)
-                implementation_plan = generate_implementation_plan_gemini(summary)
+                keyword_themes = format_themes_for_prompt(merge_theme_indexes([sketch or build_theme_index(df[suggestion_col].tolist())]))
+                implementation_plan = generate_implementation_plan_gemini(summary, keyword_themes)
             else:
                 implementation_plan = None
 
@@ -476,12 +948,17 @@ def get_suggestions():
         pdf_buffer.seek(0)
 
         return send_file(pdf_buffer, as_attachment=True, download_name="Suggestions_Summary.pdf", mimetype="application/pdf")
+    except InvalidUploadRefs as e:
+        return jsonify({"error": str(e)}), 400
+    except StoredUploadNotFound as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/clear-chart-cache', methods=['POST'])
 def clear_cache():
     """Clear the chart cache to force regeneration of charts"""
+    from feedback_processor import clear_chart_cache
     try:
         success = clear_chart_cache()
         if success:
@@ -0,0 +1,15 @@
+"""
+Benchmarks for the report pipeline.
+
+Runs the real processing code (column grouping, summary tables, chart
+rendering, the PDF classes and process_feedback end to end) on synthetic
+surveys from survey.py, against mongomock or a local mongod and with a stub
+Gemini model, and writes the timings as JSON so runs can be compared:
+
+    cd server
+    python -m benchmarks.run --preset departments-30 --output results.json
+    python -m benchmarks.run --preset departments-30 --compare results.json
+
+mongomock is only needed for --mongo mongomock (the default):
+pip install mongomock.
+"""
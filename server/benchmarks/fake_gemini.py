@@ -0,0 +1,81 @@
+"""
+Fake Gemini REST API for load tests.
+
+Answers every POST .../models/<model>:generateContent with a fixed summary
+after a configurable latency (plus random jitter), so the app's real
+google-generativeai client code runs without calling Google. Point the app
+at it with GEMINI_API_ENDPOINT=http://127.0.0.1:<port> and any
+GEMINI_API_KEY.
+
+    python -m benchmarks.fake_gemini --port 8765 --latency 1.5 --jitter 0.5
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stubs import STUB_SUMMARY
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    jitter = 0.0
+    calls = 0
+    _calls_lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if not self.path.split('?')[0].endswith(':generateContent'):
+            self._reply(404, {'error': {'code': 404, 'message': f'Unknown method {self.path}', 'status': 'NOT_FOUND'}})
+            return
+        with FakeGeminiHandler._calls_lock:
+            FakeGeminiHandler.calls += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        self._reply(200, {
+            'candidates': [{
+                'content': {'parts': [{'text': STUB_SUMMARY}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+                'safetyRatings': [],
+            }],
+            'promptFeedback': {'safetyRatings': []},
+        })
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_gemini(port=0, latency=0.0, jitter=0.0):
+    """Serve the fake API from a daemon thread; returns the server (server.server_port is the port)"""
+    FakeGeminiHandler.latency = latency
+    FakeGeminiHandler.jitter = jitter
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeGeminiHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-gemini', daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake Gemini generateContent server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=1.0, help='seconds per call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random extra latency')
+    args = parser.parse_args()
+    server = start_fake_gemini(args.port, args.latency, args.jitter)
+    print(f"🤖 Fake Gemini listening on http://127.0.0.1:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
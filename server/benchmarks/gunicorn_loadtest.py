@@ -0,0 +1,44 @@
+"""
+Gunicorn configuration for load tests: the production gunicorn.conf.py, plus
+the Mongo stand-in.
+
+With LOADTEST_MONGO=mongomock every worker gets its own in-memory database
+(patched here, in the master, before the app is preloaded). Workers share
+nothing then, so post_fork stores the LOADTEST_SURVEY file in each worker
+under LOADTEST_SURVEY_NAME through the real /upload handler; header probes
+and stored-file requests by filename then work whichever worker answers.
+With a real mongod (LOADTEST_MONGO=local) workers share data as in
+production and nothing is patched.
+"""
+import os
+import runpy
+import sys
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+globals().update({
+    name: value for name, value in runpy.run_path(os.path.join(SERVER_DIR, 'gunicorn.conf.py')).items()
+    if not name.startswith('__')
+})
+
+if os.environ.get('LOADTEST_MONGO', 'mongomock') == 'mongomock':
+    from benchmarks.stubs import use_mongomock
+    use_mongomock()
+
+_production_post_fork = post_fork  # noqa: F821 (defined by gunicorn.conf.py)
+
+
+def post_fork(server, worker):
+    _production_post_fork(server, worker)
+    survey = os.environ.get('LOADTEST_SURVEY')
+    if os.environ.get('LOADTEST_MONGO', 'mongomock') != 'mongomock' or not survey:
+        return
+    from io import BytesIO
+    from app import app
+    with open(survey, 'rb') as f:
+        data = f.read()
+    response = app.test_client().post('/upload', data={'file': (BytesIO(data), os.environ['LOADTEST_SURVEY_NAME'])})
+    if response.status_code != 200:
+        print(f"⚠️ Could not seed worker {os.getpid()}: {response.get_json()}")
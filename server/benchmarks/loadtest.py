@@ -0,0 +1,385 @@
+"""
+Load test for the Flask API under gunicorn, with a performance regression gate.
+
+Starts the real app under gunicorn (benchmarks/gunicorn_loadtest.py: the
+production config plus a Mongo stand-in) and a fake Gemini server, then
+drives it from --concurrency client threads for --duration seconds with a
+weighted mix of uploads, header probes, chart previews, grouped reports and
+suggestion summaries. Reports throughput, p50/p95/p99 per workload and peak
+RSS per worker, and can fail the run against a stored baseline:
+
+    python -m benchmarks.loadtest --workers 4 --concurrency 8 --duration 60 \\
+        --save-baseline benchmarks/baselines/4w-8c.json
+    python -m benchmarks.loadtest --workers 4 --concurrency 8 --duration 60 \\
+        --baseline benchmarks/baselines/4w-8c.json      # exit 1 on regression
+
+--url targets a server that is already running instead (no gunicorn, no
+fake Gemini, no RSS sampling).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+import psutil
+
+from benchmarks.fake_gemini import FakeGeminiHandler, start_fake_gemini
+from benchmarks.run import PRESETS
+from benchmarks.survey import make_survey, to_csv_bytes
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SURVEY_NAME = 'loadtest-survey.csv'
+DEFAULT_MIX = 'upload=1,headers=4,chart_preview=3,grouped_report=1,suggestions=1'
+REQUEST_TIMEOUT = 600
+
+
+def encode_multipart(fields, files=()):
+    """multipart/form-data body for urllib; files are (field, filename, bytes)"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        )
+    for name, filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def http(method, url, fields=None, files=()):
+    """Send one request and read the whole response; returns the status code"""
+    data, headers = None, {}
+    if fields is not None or files:
+        data, headers['Content-Type'] = encode_multipart(fields or {}, files)
+    request = urllib.request.Request(url, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def workloads(base_url, survey_bytes):
+    """name -> zero-argument callable returning a status code"""
+    return {
+        'upload': lambda: http('POST', f'{base_url}/upload', files=[('file', SURVEY_NAME, survey_bytes)]),
+        'headers': lambda: http('GET', f'{base_url}/headers/{SURVEY_NAME}'),
+        # One request renders and returns every preview, whichever worker stored the specs
+        'chart_preview': lambda: http('POST', f'{base_url}/generate-charts', fields={
+            'storedFilename': SURVEY_NAME, 'choice': '1', 'chartProfile': 'preview', 'bundle': 'zip'}),
+        'grouped_report': lambda: http('POST', f'{base_url}/generate-report', fields={
+            'storedFilename': SURVEY_NAME, 'choice': '2', 'feedbackType': 'stakeholder'}),
+        'suggestions': lambda: http('POST', f'{base_url}/get-suggestions', fields={'feedbackType': 'stakeholder'},
+                                    files=[('files[]', SURVEY_NAME, survey_bytes)]),
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return round(values[index], 4)
+
+
+class RssSampler:
+    """Peak RSS of every worker (child) of the gunicorn master, sampled on a timer"""
+
+    def __init__(self, master_pid, interval=0.25):
+        self.master = psutil.Process(master_pid)
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                children = self.master.children()
+            except psutil.Error:
+                return
+            for child in children:
+                try:
+                    rss = child.memory_info().rss
+                except psutil.Error:
+                    continue
+                self.peaks[child.pid] = max(self.peaks.get(child.pid, 0), rss)
+
+
+def run_load(base_url, survey_bytes, mix, concurrency, duration, seed=0):
+    """Closed-loop load: each client thread sends its next request as soon as the last one finishes"""
+    calls = workloads(base_url, survey_bytes)
+    unknown = set(mix) - set(calls)
+    if unknown:
+        raise SystemExit(f"Unknown workloads in mix: {', '.join(sorted(unknown))} (known: {', '.join(calls)})")
+    names, weights = list(mix), list(mix.values())
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = calls[name]()
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[name].append(elapsed)
+                if status is None or status >= 400:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for name in names:
+        values = latencies.get(name, [])
+        results[name] = {
+            'requests': len(values),
+            'errors': errors.get(name, 0),
+            'throughput_rps': round(len(values) / elapsed, 3),
+            'p50_s': percentile(values, 50),
+            'p95_s': percentile(values, 95),
+            'p99_s': percentile(values, 99),
+            'max_s': round(max(values), 4) if values else None,
+        }
+    total = sum(len(values) for values in latencies.values())
+    every = [value for values in latencies.values() for value in values]
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'requests': total,
+        'errors': sum(errors.values()),
+        'throughput_rps': round(total / elapsed, 3),
+        'p50_s': percentile(every, 50),
+        'p95_s': percentile(every, 95),
+        'p99_s': percentile(every, 99),
+        'workloads': results,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(base_url, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit("gunicorn exited during startup")
+        try:
+            if http('GET', f'{base_url}/health') == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"{base_url} did not become healthy within {timeout}s")
+
+
+def start_gunicorn(workers, port, workdir, env):
+    log = open(os.path.join(workdir, 'gunicorn.log'), 'w')
+    # Run from the scratch dir so reports and charts written to ./feedback_catalyst land there
+    env = dict(env, PYTHONPATH=os.pathsep.join(filter(None, [SERVER_DIR, env.get('PYTHONPATH')])))
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(SERVER_DIR, 'benchmarks', 'gunicorn_loadtest.py'),
+        '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+        '--access-logfile', '-', 'app:app'
+    ]
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT), log
+
+
+def check_regressions(results, baseline, max_slowdown, max_rss_growth, max_error_rate_increase):
+    """Regressions against a baseline run, as readable strings"""
+    problems = []
+    if results['throughput_rps'] < baseline['throughput_rps'] / max_slowdown:
+        problems.append(f"throughput {results['throughput_rps']} rps < baseline {baseline['throughput_rps']} / {max_slowdown}")
+    for name, now in results['workloads'].items():
+        before = baseline.get('workloads', {}).get(name)
+        if not before or not before.get('p95_s') or not now.get('p95_s'):
+            continue
+        if now['p95_s'] > before['p95_s'] * max_slowdown:
+            problems.append(f"{name} p95 {now['p95_s']}s > baseline {before['p95_s']}s x {max_slowdown}")
+        error_rate = now['errors'] / now['requests'] if now['requests'] else 0
+        baseline_error_rate = before['errors'] / before['requests'] if before['requests'] else 0
+        if error_rate > baseline_error_rate + max_error_rate_increase:
+            problems.append(f"{name} error rate {error_rate:.1%} > baseline {baseline_error_rate:.1%}")
+    if results.get('peak_worker_rss_mb') and baseline.get('peak_worker_rss_mb'):
+        if results['peak_worker_rss_mb'] > baseline['peak_worker_rss_mb'] * max_rss_growth:
+            problems.append(
+                f"peak worker RSS {results['peak_worker_rss_mb']} MB > baseline {baseline['peak_worker_rss_mb']} MB x {max_rss_growth}"
+            )
+    return problems
+
+
+def print_report(results):
+    print(f"\n{'workload':<16}{'requests':>9}{'errors':>8}{'rps':>8}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    for name, stats in results['workloads'].items():
+        cells = [stats[key] if stats[key] is not None else 0 for key in ('p50_s', 'p95_s', 'p99_s')]
+        print(f"{name:<16}{stats['requests']:>9}{stats['errors']:>8}{stats['throughput_rps']:>8.2f}"
+              f"{cells[0]:>9.3f}{cells[1]:>9.3f}{cells[2]:>9.3f}")
+    print(f"{'all':<16}{results['requests']:>9}{results['errors']:>8}{results['throughput_rps']:>8.2f}"
+          f"{results['p50_s'] or 0:>9.3f}{results['p95_s'] or 0:>9.3f}{results['p99_s'] or 0:>9.3f}")
+    if results.get('worker_rss_mb'):
+        print(f"peak RSS per worker (MB): {results['worker_rss_mb']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load after warm-up')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of untimed load first')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'workload weights (default {DEFAULT_MIX})')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small', help='survey shape (benchmarks.run presets)')
+    parser.add_argument('--gemini-latency', type=float, default=1.0)
+    parser.add_argument('--gemini-jitter', type=float, default=0.2)
+    parser.add_argument('--mongo', choices=('mongomock', 'local'), default='mongomock',
+                        help='in-memory mongomock per worker, or the MONGO_URI/localhost server')
+    parser.add_argument('--url', help='load an already running server instead of starting gunicorn')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--save-baseline', help='write results as a baseline file')
+    parser.add_argument('--baseline', help='fail when results regress past this baseline')
+    parser.add_argument('--max-slowdown', type=float, default=1.3, help='allowed p95/throughput ratio')
+    parser.add_argument('--max-rss-growth', type=float, default=1.25, help='allowed peak worker RSS ratio')
+    parser.add_argument('--max-error-rate-increase', type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    survey_args = dict(PRESETS[args.preset], seed=args.seed)
+    survey_bytes = to_csv_bytes(make_survey(**survey_args))
+    workdir = tempfile.mkdtemp(prefix='feedback-loadtest-')
+    process = log = sampler = gemini = results = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            gemini = start_fake_gemini(latency=args.gemini_latency, jitter=args.gemini_jitter)
+            survey_path = os.path.join(workdir, SURVEY_NAME)
+            with open(survey_path, 'wb') as f:
+                f.write(survey_bytes)
+            port = free_port()
+            env = dict(
+                os.environ,
+                GEMINI_API_ENDPOINT=f'http://127.0.0.1:{gemini.server_port}',
+                GEMINI_API_KEY='loadtest',
+                LOADTEST_MONGO=args.mongo,
+                LOADTEST_SURVEY=survey_path,
+                LOADTEST_SURVEY_NAME=SURVEY_NAME,
+                PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+                TRACE_FILE=os.path.join(workdir, 'traces.jsonl'),
+            )
+            process, log = start_gunicorn(args.workers, port, workdir, env)
+            base_url = f'http://127.0.0.1:{port}'
+            print(f"🚀 gunicorn with {args.workers} workers on {base_url} (logs in {workdir}/gunicorn.log)")
+        wait_until_healthy(base_url, process)
+        if args.url or args.mongo == 'local':
+            # Workers share one database: store the survey once
+            http('POST', f'{base_url}/upload', files=[('file', SURVEY_NAME, survey_bytes)])
+
+        mix = parse_mix(args.mix)
+        if args.warmup:
+            print(f"🔥 Warming up for {args.warmup:g}s")
+            run_load(base_url, survey_bytes, mix, args.concurrency, args.warmup, args.seed + 1000)
+        if process is not None:
+            sampler = RssSampler(process.pid)
+            sampler.start()
+        print(f"📈 {args.concurrency} clients for {args.duration:g}s, mix {mix}")
+        results = run_load(base_url, survey_bytes, mix, args.concurrency, args.duration, args.seed)
+        if sampler is not None:
+            sampler.stop()
+            results['worker_rss_mb'] = {str(pid): round(rss / 1024 / 1024, 1) for pid, rss in sampler.peaks.items()}
+            results['peak_worker_rss_mb'] = max(results['worker_rss_mb'].values(), default=None)
+        results['config'] = {
+            'workers': args.workers if not args.url else None, 'concurrency': args.concurrency,
+            'duration_s': args.duration, 'mix': mix, 'survey': survey_args, 'mongo': args.mongo,
+            'gemini_latency_s': args.gemini_latency, 'gemini_jitter_s': args.gemini_jitter,
+        }
+        if gemini is not None:
+            results['gemini_calls'] = FakeGeminiHandler.calls
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        if gemini is not None:
+            gemini.shutdown()
+
+    if results is None:
+        print(f"❌ Load test did not finish; gunicorn logs are in {workdir}")
+        return 1
+    print_report(results)
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"✅ Results written to {path}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('mix') != results['config']['mix']:
+            print("⚠️  Baseline was recorded with a different workload mix")
+        problems = check_regressions(
+            results, baseline, args.max_slowdown, args.max_rss_growth, args.max_error_rate_increase
+        )
+        if problems:
+            print("❌ Performance regression:")
+            for problem in problems:
+                print(f"   - {problem}")
+            return 1
+        print("✅ Within baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
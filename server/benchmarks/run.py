@@ -0,0 +1,223 @@
+"""
+Run the pipeline benchmarks and write the results as JSON.
+
+    python -m benchmarks.run [--preset NAME | --rows N --likert N ...] [--output FILE] [--compare FILE]
+
+Each benchmark runs `--warmup` untimed times, then `--repeats` timed times;
+min/median/mean/max are reported in seconds. With --compare, medians are
+compared to an earlier results file and the run exits with status 1 when a
+benchmark got slower than --max-slowdown times its baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stubs import StubModel, use_mongomock, use_stub_llm
+from benchmarks.survey import LAYOUTS, make_survey, to_csv_bytes
+
+PRESETS = {
+    'small': dict(rows=200, likert_columns=12, categories=4, groups=5, suggestion_words=12, layout='stakeholder'),
+    'wide-alumni': dict(rows=1500, likert_columns=60, categories=10, groups=4, suggestion_words=30, layout='stakeholder'),
+    'departments-30': dict(rows=3000, likert_columns=20, categories=5, groups=30, suggestion_words=12, layout='stakeholder'),
+    'subject': dict(rows=400, likert_columns=15, categories=1, groups=6, suggestion_words=0, layout='subject'),
+}
+
+
+def measure(func, repeats, warmup, verbose=False):
+    timings = []
+    for run in range(warmup + repeats):
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        if run >= warmup:
+            timings.append(elapsed)
+    return {
+        'repeats': len(timings),
+        'min_s': round(min(timings), 6),
+        'median_s': round(statistics.median(timings), 6),
+        'mean_s': round(statistics.mean(timings), 6),
+        'max_s': round(max(timings), 6),
+    }
+
+
+def build_benchmarks(survey, layout, chart_style):
+    """name -> zero-argument callable, each running one part of the real pipeline"""
+    import feedback_processor as fp
+
+    csv_bytes = to_csv_bytes(survey)
+    df, category_groups, short_labels = fp._get_data_and_groups(survey.copy(), layout)
+    summaries = [
+        (category, fp.generate_summary_table(df, cols, short_labels, layout))
+        for category, cols in category_groups.items()
+    ]
+    first_category, first_summary = summaries[0]
+    print_png = fp.render_ratings_png(first_summary, first_category, 'Benchmark', layout, 'print')
+    png_path = os.path.abspath('benchmark-chart.png')
+    with open(png_path, 'wb') as f:
+        f.write(print_png)
+
+    def build_pdf():
+        if layout == 'stakeholder':
+            pdf = fp.StakeholderPDF()
+            pdf.add_page()
+            for category, summary in summaries:
+                pdf.section_title(f"{category} Feedback Summary")
+                pdf.table(summary)
+        else:
+            pdf = fp.SubjectPDF()
+            pdf.add_page()
+            for category, summary in summaries:
+                pdf.section_title(category)
+                pdf.table(summary, pdf.get_y())
+        pdf.add_page()
+        pdf.image(png_path, x=1, y=5, w=pdf.w - 2)
+        pdf.insert_vector_chart(first_summary, first_category, 'Benchmark')
+        return pdf.output(dest='S')
+
+    return {
+        'parse_csv': lambda: fp.read_feedback_file(io.BytesIO(csv_bytes)),
+        'get_data_and_groups': lambda: fp._get_data_and_groups(survey.copy(), layout),
+        'generate_summary_table': lambda: [
+            fp.generate_summary_table(df, cols, short_labels, layout) for cols in category_groups.values()
+        ],
+        'plot_ratings': lambda: fp.plot_ratings(first_summary, first_category, 'Benchmark', layout),
+        'render_preview_png': lambda: fp.render_ratings_png(first_summary, first_category, 'Benchmark', layout, 'preview'),
+        f'{layout}_pdf': build_pdf,
+        'process_feedback_overall': lambda: fp.process_feedback(
+            io.BytesIO(csv_bytes), 'benchmark.csv', '1', layout, chart_style=chart_style),
+        'process_feedback_grouped': lambda: fp.process_feedback(
+            io.BytesIO(csv_bytes), 'benchmark.csv', '2', layout, chart_style=chart_style),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import matplotlib
+    import pandas
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__,
+        'commit': commit or None,
+    }
+
+
+def peak_rss_mb():
+    import resource
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def compare(results, baseline, max_slowdown):
+    """Print median ratios against a baseline; returns the names that regressed"""
+    regressions = []
+    print(f"\n{'benchmark':<28}{'baseline s':>12}{'now s':>12}{'ratio':>8}")
+    for name, result in results['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before['median_s']:
+            print(f"{name:<28}{'-':>12}{result['median_s']:>12.4f}{'new':>8}")
+            continue
+        ratio = result['median_s'] / before['median_s']
+        flag = '  <-- slower' if ratio > max_slowdown else ''
+        print(f"{name:<28}{before['median_s']:>12.4f}{result['median_s']:>12.4f}{ratio:>8.2f}{flag}")
+        if ratio > max_slowdown:
+            regressions.append(name)
+    if baseline.get('survey') != results['survey']:
+        print("⚠️  Baseline was recorded with a different survey; ratios are not comparable")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--likert', type=int, dest='likert_columns')
+    parser.add_argument('--categories', type=int)
+    parser.add_argument('--groups', type=int)
+    parser.add_argument('--suggestion-words', type=int)
+    parser.add_argument('--layout', choices=LAYOUTS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chart-style', default='raster', help='raster, composite or vector (process_feedback only)')
+    parser.add_argument('--only', action='append', help='run only these benchmarks (repeatable)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--mongo', choices=('mongomock', 'local'), default='mongomock',
+                        help='mongomock, or the MONGO_URI/localhost server the app would use')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds the stub Gemini model takes per call')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='earlier results JSON to compare medians with')
+    parser.add_argument('--max-slowdown', type=float, default=1.25)
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    args = parser.parse_args(argv)
+
+    survey_args = dict(PRESETS[args.preset])
+    for key in ('rows', 'likert_columns', 'categories', 'groups', 'suggestion_words', 'layout'):
+        if getattr(args, key) is not None:
+            survey_args[key] = getattr(args, key)
+    survey_args['seed'] = args.seed
+
+    use_stub_llm(args.llm_latency)
+    if args.mongo == 'mongomock':
+        use_mongomock()
+
+    # Reports are written to ./feedback_catalyst; keep them out of the source tree
+    workdir = tempfile.mkdtemp(prefix='feedback-benchmarks-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        survey = make_survey(**survey_args)
+        with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+            benchmarks = build_benchmarks(survey, survey_args['layout'], args.chart_style)
+        selected = {name: func for name, func in benchmarks.items() if not args.only or name in args.only}
+        results = {
+            'survey': survey_args,
+            'chart_style': args.chart_style,
+            'mongo': args.mongo,
+            'llm_latency_s': args.llm_latency,
+            'environment': environment(),
+            'results': {},
+        }
+        print(f"📊 Survey {survey_args}: {survey.shape[0]} rows x {survey.shape[1]} columns")
+        for name, func in selected.items():
+            results['results'][name] = measure(func, args.repeats, args.warmup, args.verbose)
+            result = results['results'][name]
+            print(f"  {name:<28} median {result['median_s']:.4f}s  min {result['min_s']:.4f}s  max {result['max_s']:.4f}s")
+        results['llm_calls'] = StubModel.calls
+        results['peak_rss_mb'] = peak_rss_mb()
+        print(f"  peak RSS {results['peak_rss_mb']} MB")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_slowdown)
+        if regressions:
+            print(f"❌ Slower than {args.max_slowdown}x baseline: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Stand-ins for the external services, installed before the pipeline first uses them.
+
+use_stub_llm() puts a fake google.generativeai module in sys.modules whose
+model answers after a fixed latency, so runs measure our code and not
+Gemini. use_mongomock() points PyMongo at an in-memory mongomock server;
+without it the benchmarks use MONGO_URI (or a local mongod) like the app.
+"""
+import os
+import sys
+import time
+import types
+
+STUB_SUMMARY = (
+    "Students ask for more practical lab sessions, better library resources and "
+    "improvements to canteen food and hostel wifi."
+)
+
+
+class StubModel:
+    latency = 0.0
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def generate_content(self, prompt):
+        StubModel.calls += 1
+        if StubModel.latency:
+            time.sleep(StubModel.latency)
+        return types.SimpleNamespace(text=STUB_SUMMARY)
+
+
+def use_stub_llm(latency=0.0):
+    """Replace the Gemini SDK with StubModel, answering after `latency` seconds"""
+    StubModel.latency = latency
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = StubModel
+    google = sys.modules.get('google') or types.ModuleType('google')
+    google.generativeai = genai
+    sys.modules['google'] = google
+    sys.modules['google.generativeai'] = genai
+    # Take the configured-key path in get_model(), not the hardcoded fallback
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark-stub')
+
+
+def use_mongomock():
+    """Make every MongoClient created from now on an in-memory mongomock client"""
+    try:
+        import mongomock
+        import mongomock.gridfs
+    except ImportError:
+        raise SystemExit("mongomock is not installed: pip install mongomock, or use --mongo local")
+    import pymongo
+    mongomock.gridfs.enable_gridfs_integration()
+    pymongo.MongoClient = mongomock.MongoClient
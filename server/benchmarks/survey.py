@@ -0,0 +1,78 @@
+"""
+Synthetic feedback surveys shaped like the real exports.
+
+Stakeholder surveys use bracketed Google Forms headers ("Curriculum [Question
+3]") grouped into categories; subject surveys have one plain Likert column
+per subject/faculty item. Both have a name column, a group column (Branch or
+Department) and a free-text suggestion column, so every pipeline path is
+exercised. The same arguments and seed always give the same survey.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+CATEGORY_NAMES = [
+    'Curriculum', 'Facilities', 'Skill Enhancement', 'Social Engagement', 'ICT Support',
+    'Administrative', 'Library', 'Canteen', 'Cultural', 'Hostel'
+]
+SUGGESTION_WORDS = (
+    'more practical lab sessions better library books improve canteen food quality wifi in hostel '
+    'industry visits guest lectures updated syllabus placement training clean washrooms sports '
+    'facilities timely results faculty feedback projector maintenance'
+).split()
+LAYOUTS = ('stakeholder', 'subject')
+
+
+def make_survey(rows=200, likert_columns=12, categories=4, groups=5, suggestion_words=12,
+                layout='stakeholder', missing_rate=0.02, seed=0):
+    """
+    Build a survey DataFrame.
+
+    likert_columns are spread evenly over `categories` bracketed groups
+    (stakeholder layout) or named per subject (subject layout); `groups` is the
+    number of distinct Branch/Department values; `suggestion_words` is the
+    average length of a suggestion, 0 for no suggestion column.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    rng = np.random.default_rng(seed)
+    group_column = 'Branch' if layout == 'stakeholder' else 'Department'
+    data = {
+        'Name': [f'Respondent {i + 1}' for i in range(rows)],
+        group_column: rng.choice([f'{group_column} {i + 1}' for i in range(max(1, groups))], rows),
+    }
+
+    for index in range(likert_columns):
+        if layout == 'stakeholder':
+            category = _category_name(index % max(1, categories))
+            column = f'{category} [Question {index // max(1, categories) + 1}: how satisfied are you with this aspect?]'
+        else:
+            column = f'Subject {index + 1} - Faculty {index % 7 + 1}: Teaching effectiveness'
+        # Skewed towards positive answers, like real feedback
+        ratings = rng.choice([1, 2, 3, 4, 5], rows, p=[0.05, 0.1, 0.2, 0.35, 0.3]).astype(float)
+        ratings[rng.random(rows) < missing_rate] = np.nan
+        data[column] = ratings
+
+    if suggestion_words:
+        lengths = rng.poisson(suggestion_words, rows)
+        data['Any suggestions for improvement?'] = [
+            ' '.join(rng.choice(SUGGESTION_WORDS, length)) if length else None for length in lengths
+        ]
+    return pd.DataFrame(data)
+
+
+def _category_name(index):
+    if index < len(CATEGORY_NAMES):
+        return CATEGORY_NAMES[index]
+    return f'Category {index + 1}'
+
+
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def to_xlsx_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
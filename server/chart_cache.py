@@ -0,0 +1,141 @@
+"""
+HTTP caching and streamed delivery of chart PNGs stored in GridFS.
+
+Every chart response carries a strong ETag derived from the GridFS file (md5
+when the driver stored one, otherwise the upload id, which changes whenever a
+chart is regenerated), so repeat views are answered with 304 before any chunk
+is read. Small, frequently viewed PNGs are also kept in a bounded per-worker
+LRU; everything else is streamed chunk by chunk from GridFS. Content-addressed
+charts found in the LRU are answered (200 or 304) without querying MongoDB.
+
+A whole set of charts can also be delivered as one streamed ZIP bundle, looked
+up with a single $in query instead of one request and lookup per chart.
+"""
+import io
+import json
+import os
+import re
+import zipfile
+
+from cache import LRUCache
+
+CHART_CACHE_MB = int(os.environ.get('CHART_CACHE_MB', 64))
+# Bigger charts are always streamed rather than cached
+CHART_CACHE_MAX_ITEM_BYTES = 2 * 1024 * 1024
+# Names ending in a content digest never change, so they may be cached forever
+CONTENT_ADDRESSED_RE = re.compile(r'_[0-9a-f]{16}\.png$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+# filename -> {'etag': ..., 'data': ...}
+_hot_charts = LRUCache(max_items=512, max_bytes=CHART_CACHE_MB * 1024 * 1024, sizeof=lambda entry: len(entry['data']))
+
+
+def chart_etag(grid_out):
+    return grid_out.md5 or str(grid_out._id)
+
+
+def chart_cache_control(filename):
+    return IMMUTABLE_CACHE_CONTROL if CONTENT_ADDRESSED_RE.search(filename) else REVALIDATE_CACHE_CONTROL
+
+
+def cached_chart(filename, etag):
+    """PNG bytes from the hot cache, if the cached copy is still the current version"""
+    entry = _hot_charts.get(filename)
+    if entry and entry['etag'] == etag:
+        return entry['data']
+    return None
+
+
+def hot_chart(filename):
+    """
+    Hot-cache entry ({'etag', 'data'}) of a content-addressed chart, looked up by name
+    alone: such a name always holds the same picture, so no GridFS lookup is needed
+    to know the cached copy is current. None for other names or on a miss.
+    """
+    if not CONTENT_ADDRESSED_RE.search(filename):
+        return None
+    return _hot_charts.get(filename)
+
+
+def stream_chart(grid_out, filename, etag):
+    """Yield a GridFS file one chunk at a time, remembering small files in the hot cache"""
+    keep = grid_out.length <= CHART_CACHE_MAX_ITEM_BYTES
+    chunks = []
+    try:
+        for chunk in iter(grid_out.readchunk, b''):
+            if keep:
+                chunks.append(chunk)
+            yield chunk
+    finally:
+        grid_out.close()
+    if keep:
+        _hot_charts.put(filename, {'etag': etag, 'data': b''.join(chunks)})
+
+
+def clear_hot_charts():
+    _hot_charts.clear()
+
+
+def remember_chart(filename, etag, data):
+    if len(data) <= CHART_CACHE_MAX_ITEM_BYTES:
+        _hot_charts.put(filename, {'etag': etag, 'data': data})
+
+
+def find_latest_charts(fs, filenames):
+    """Newest GridFS version of each chart, fetched with one $in query; returns {filename: GridOut}"""
+    latest = {}
+    for grid_out in fs.find({'filename': {'$in': list(set(filenames))}}).sort([('uploadDate', -1), ('_id', -1)]):
+        latest.setdefault(grid_out.filename, grid_out)
+    return latest
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable target that lets zipfile produce a ZIP as a stream of chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_chart_bundle(fs, filenames, chart_url=None):
+    """
+    Yield a ZIP with every requested chart plus a manifest.json listing them in order.
+    PNGs are already compressed, so entries are stored rather than deflated.
+    """
+    latest = find_latest_charts(fs, filenames)
+    manifest = {'charts': [], 'missing': [name for name in filenames if name not in latest]}
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as bundle:
+        for name in dict.fromkeys(filenames):
+            grid_out = latest.get(name)
+            if grid_out is None:
+                continue
+            etag = chart_etag(grid_out)
+            manifest['charts'].append({
+                'filename': name,
+                'etag': etag,
+                'size': grid_out.length,
+                **({'url': chart_url(name)} if chart_url else {})
+            })
+            with bundle.open(zipfile.ZipInfo(name), 'w') as entry:
+                data = cached_chart(name, etag)
+                if data is not None:
+                    entry.write(data)
+                else:
+                    for chunk in stream_chart(grid_out, name, etag):
+                        entry.write(chunk)
+            yield sink.drain()
+        bundle.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield sink.drain()
@@ -0,0 +1,52 @@
+"""
+Named output profiles for rating chart PNGs.
+
+A profile sets the resolution, PNG compression level, alpha flattening and
+optional palette quantization of a rendered chart. Report PDFs use 'print';
+the chart view uses 'preview' unless the client asks for something else. Figure sizes follow the
+number of categories, so small charts are no longer drawn on a 30-40 inch canvas.
+"""
+import os
+from io import BytesIO
+
+CHART_PROFILES = {
+    # Same resolution as the original charts, for PDF pages. Flattened to RGB because FPDF
+    # splits an alpha channel out of a PNG in pure Python, which dominates report time.
+    'print': {'dpi': 100, 'compress_level': 6, 'flatten': True, 'quantize': None},
+    # Browser chart view: half resolution, 64-colour palette
+    'preview': {'dpi': 50, 'compress_level': 6, 'flatten': True, 'quantize': 64},
+    # Small overview images
+    'thumbnail': {'dpi': 20, 'compress_level': 9, 'flatten': True, 'quantize': 32},
+}
+DEFAULT_VIEW_PROFILE = os.environ.get('CHART_VIEW_PROFILE', 'preview')
+
+
+def get_chart_profile(name=None):
+    """Settings of a named profile; None gives 'print'"""
+    name = name or 'print'
+    if name not in CHART_PROFILES:
+        raise ValueError(f"Unknown chart profile '{name}'. Use one of: {', '.join(CHART_PROFILES)}")
+    return CHART_PROFILES[name]
+
+
+def chart_figsize(feedback_type, n_categories):
+    """Figure size in inches, growing with the number of categories up to the original fixed size"""
+    if feedback_type == 'stakeholder':
+        return min(30, 12 + 2.5 * n_categories), max(10, n_categories * 1.0)
+    return min(40, 16 + 3 * n_categories), 20
+
+
+def figure_to_png(fig, profile_name=None):
+    """Encode a figure as PNG bytes using the profile's DPI, compression, alpha and palette settings"""
+    profile = get_chart_profile(profile_name)
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=profile['dpi'], pil_kwargs={'compress_level': profile['compress_level']})
+    if profile['flatten'] or profile['quantize']:
+        from PIL import Image
+        buffer.seek(0)
+        image = Image.open(buffer).convert('RGB')
+        if profile['quantize']:
+            image = image.quantize(profile['quantize'], method=Image.Quantize.FASTOCTREE)
+        buffer = BytesIO()
+        image.save(buffer, format='PNG', compress_level=profile['compress_level'])
+    return buffer.getvalue()
@@ -1,17 +1,101 @@
+"""
+MongoDB connection and collections, created on first use.
+
+Importing this module does not connect. The first access to any of the
+names below (database.db, database.fs_charts, ...) connects, pings and
+ensures indexes; later accesses reuse that connection.
+
+The client belongs to the process that created it. A forked child (gunicorn
+worker with preload_app) drops whatever it inherited and builds its own
+client and pool on first use, as PyMongo requires. Pool sizing comes from
+the MONGO_* settings below and checkout waits are tracked by pool_monitor.
+"""
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-import gridfs
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+SERVICE_NAMES = ('client', 'db', 'files_collection', 'charts_collection', 'themes_collection', 'fs_files', 'fs_charts', 'fs_profiles')
+# After a failed connection attempt, wait this long before trying again
+MONGO_RETRY_SECONDS = int(os.environ.get('MONGO_RETRY_SECONDS', 30))
+# Job records (status, cancellation requests) expire this long after the job started
+JOB_RETENTION_HOURS = int(os.environ.get('JOB_RETENTION_HOURS', 24))
+
+# Connection pool settings, passed to MongoClient when set (PyMongo defaults otherwise)
+MONGO_POOL_SETTINGS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', int),
+    'compressors': ('MONGO_COMPRESSORS', str),  # e.g. "zstd,zlib"
+}
+
+_services = {}
+_services_lock = threading.Lock()
+_failed_at = None
+_pool_monitor = None
+
+# Aggregation-pipeline update setting reversed_filename to the filename spelled backwards
+# (built one code point at a time; there is no string reverse operator)
+REVERSED_FILENAME_PIPELINE = [{'$set': {'reversed_filename': {'$reduce': {
+    'input': {'$range': [0, {'$strLenCP': {'$ifNull': ['$filename', '']}}]},
+    'initialValue': '',
+    'in': {'$concat': [{'$substrCP': ['$filename', '$$this', 1]}, '$$value']},
+}}}}]
+
+def mongo_client_options():
+    options = {'serverSelectionTimeoutMS': 10000}
+    for option, (env_name, cast) in MONGO_POOL_SETTINGS.items():
+        if os.environ.get(env_name):
+            options[option] = cast(os.environ[env_name])
+    return options
+
+def ensure_indexes(db):
+    """
+    Create the indexes the request handlers rely on. create_index is a no-op for
+    indexes that already exist, so this is safe to run on every startup.
+    """
+    # GridFS file documents: exact filename lookups, and suffix lookups through
+    # a prefix match on the reversed filename
+    db['files.files'].create_index([('filename', 1), ('uploadDate', 1)])
+    db['files.files'].create_index([('reversed_filename', 1)])
+    db['charts.files'].create_index([('filename', 1), ('uploadDate', 1)])
+    db['profiles.files'].create_index([('filename', 1), ('uploadDate', 1)])
+
+    # Metadata collections
+    db['files'].create_index([('file_id', 1)])
+    db['files'].create_index([('filename', 1)])
+    db['files'].create_index([('sha256', 1)])
+    db['charts'].create_index([('filename', 1)])
+    db['chart_specs'].create_index([('filename', 1)], unique=True)
+    db['themes'].create_index([('filename', 1)])
+    db['jobs'].create_index([('started_at', 1)], expireAfterSeconds=JOB_RETENTION_HOURS * 3600)
+
+    print("✅ MongoDB indexes ready")
+
+    # Backfill the reversed filename on uploads stored before it existed: one server-side
+    # update (MongoDB 4.2+ pipeline), a no-op once every upload has it
+    try:
+        result = db['files.files'].update_many({'reversed_filename': {'$exists': False}}, REVERSED_FILENAME_PIPELINE)
+        if result.modified_count:
+            print(f"✅ Backfilled reversed filenames on {result.modified_count} uploads")
+    except Exception as e:
+        print(f"⚠️  Could not backfill reversed filenames: {e}")
+
 def connect_to_mongo():
     """
     Connect to MongoDB using environment variable MONGO_URI.
     Falls back to localhost for development if MONGO_URI is not set.
     """
+    global _pool_monitor
+    import gridfs
+    from pymongo import MongoClient
+    from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+    from pool_monitor import PoolWaitMonitor
+
     # Get MongoDB URI from environment variable
     mongo_uri = os.getenv('MONGO_URI')
     
@@ -21,8 +105,9 @@ def connect_to_mongo():
         mongo_uri = 'mongodb://localhost:27017/'
     
     try:
-        # Connect to MongoDB with timeout
-        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=10000)
+        # Connect to MongoDB with timeout, pool settings and checkout monitoring
+        _pool_monitor = PoolWaitMonitor()
+        client = MongoClient(mongo_uri, event_listeners=[_pool_monitor], **mongo_client_options())
         
         # Test the connection
         client.admin.command('ping')
@@ -32,10 +117,17 @@ def connect_to_mongo():
         db = client['feedback_db']
         files_collection = db['files']
         charts_collection = db['charts']
+        themes_collection = db['themes']
         fs_files = gridfs.GridFS(db, collection='files')
         fs_charts = gridfs.GridFS(db, collection='charts')
+        fs_profiles = gridfs.GridFS(db, collection='profiles')
+
+        try:
+            ensure_indexes(db)
+        except Exception as e:
+            print(f"⚠️  Could not create MongoDB indexes: {e}")
         
-        return client, db, files_collection, charts_collection, fs_files, fs_charts
+        return client, db, files_collection, charts_collection, themes_collection, fs_files, fs_charts, fs_profiles
         
     except ConnectionFailure as e:
         print(f"❌ MongoDB connection failed: {e}")
@@ -49,15 +141,47 @@ def connect_to_mongo():
         print(f"❌ Unexpected MongoDB error: {e}")
         raise
 
-# Initialize connection
-try:
-    client, db, files_collection, charts_collection, fs_files, fs_charts = connect_to_mongo()
-except Exception as e:
-    print(f"Failed to initialize MongoDB connection: {e}")
-    # Set default values to prevent import errors
-    client = None
-    db = None
-    files_collection = None
-    charts_collection = None
-    fs_files = None
-    fs_charts = None 
\ No newline at end of file
+def get_services():
+    """Connect on first call and return the name -> client/collection mapping; values are None while Mongo is unavailable"""
+    global _failed_at
+    if _services:
+        return _services
+    with _services_lock:
+        if _services:
+            return _services
+        if _failed_at is not None and time.time() - _failed_at < MONGO_RETRY_SECONDS:
+            return dict.fromkeys(SERVICE_NAMES)
+        try:
+            _services.update(zip(SERVICE_NAMES, connect_to_mongo()))
+            _failed_at = None
+        except Exception as e:
+            print(f"Failed to initialize MongoDB connection: {e}")
+            _failed_at = time.time()
+            return dict.fromkeys(SERVICE_NAMES)
+    return _services
+
+def _reset_after_fork():
+    """In a forked child: forget the parent's client (never use or close it here) and its lock"""
+    global _services_lock, _failed_at, _pool_monitor
+    _services.clear()
+    _services_lock = threading.Lock()
+    _failed_at = None
+    _pool_monitor = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def pool_stats():
+    """This process's pool settings and checkout wait statistics; never connects"""
+    return {
+        'pid': os.getpid(),
+        'connected': bool(_services) and _services.get('client') is not None,
+        'settings': {k: v for k, v in mongo_client_options().items() if k != 'serverSelectionTimeoutMS'},
+        'checkout': _pool_monitor.stats() if _pool_monitor else None
+    }
+
+def __getattr__(name):
+    # database.db, from database import fs_charts, ... connect lazily
+    if name in SERVICE_NAMES:
+        return get_services()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
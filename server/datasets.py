@@ -0,0 +1,93 @@
+"""
+Loading stored uploads for report, chart and suggestion generation.
+
+Clients can refer to a file they already sent to /upload by its GridFS id or
+stored filename instead of posting it again. Parsed DataFrames are kept in a
+per-worker LRU keyed by content hash, so repeat actions on the same upload
+skip both the GridFS read and the parse.
+"""
+import os
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+import database
+from cache import LRUCache
+from metrics import stage
+
+DATASET_CACHE_MB = int(os.environ.get('DATASET_CACHE_MB', 128))
+
+
+def _frame_size(entry):
+    _, df = entry
+    return int(df.memory_usage(deep=True).sum())
+
+
+# sha256 -> (columns loaded or None for all of them, DataFrame)
+_dataset_cache = LRUCache(max_items=32, max_bytes=DATASET_CACHE_MB * 1024 * 1024, sizeof=_frame_size)
+
+
+class StoredUploadNotFound(Exception):
+    pass
+
+
+def find_upload(file_id=None, filename=None):
+    """Metadata document of a stored upload, looked up by GridFS id or by filename (newest wins)"""
+    if file_id:
+        try:
+            doc = database.files_collection.find_one({'file_id': ObjectId(str(file_id))})
+        except InvalidId:
+            doc = None
+        if not doc:
+            raise StoredUploadNotFound(f"No stored upload with id {file_id}")
+        return doc
+    doc = next(iter(database.files_collection.find({'filename': filename}).sort('_id', -1).limit(1)), None)
+    if not doc:
+        raise StoredUploadNotFound(f"No stored upload named {filename}")
+    return doc
+
+
+def ensure_profile(meta):
+    """Return the upload's profile, computing and saving it for uploads stored before profiling existed"""
+    if meta.get('profile'):
+        return meta['profile']
+    from feedback_processor import profile_dataframe
+    df = load_dataset(meta)
+    profile = profile_dataframe(df)
+    database.files_collection.update_one({'_id': meta['_id']}, {'$set': {'profile': profile}})
+    meta['profile'] = profile
+    return profile
+
+
+def load_dataset(meta, columns=None):
+    """Parse a stored upload (only the given columns, if any), reusing the cached frame when it covers them"""
+    key = meta.get('sha256') or str(meta['file_id'])
+    wanted = columns
+    cached = _dataset_cache.get(key)
+    if cached is not None:
+        cached_columns, df = cached
+        if cached_columns is None or (columns is not None and set(columns) <= set(cached_columns)):
+            return _select(df, wanted)
+        # Widen the cached frame to cover both column sets
+        columns = list(dict.fromkeys(list(cached_columns) + list(columns))) if columns is not None else None
+
+    from feedback_processor import read_feedback_file
+    with stage('gridfs_get'):
+        grid_out = database.fs_files.get(meta['file_id'])
+    try:
+        # Chunks are read while parsing, so that time counts towards 'parse'
+        df = read_feedback_file(grid_out, columns)
+    finally:
+        grid_out.close()
+    # Profiles refer to columns by their string names
+    df.columns = [str(col) for col in df.columns]
+    _dataset_cache.put(key, (list(columns) if columns is not None else None, df))
+    return _select(df, wanted)
+
+
+def _select(df, columns):
+    return df if columns is None else df[[col for col in columns if col in df.columns]]
+
+
+def clear_dataset_cache():
+    _dataset_cache.clear()
@@ -0,0 +1,155 @@
+"""
+Latency budgets for report generation.
+
+A report request gets a budget in seconds (the deadlineSeconds form field or
+X-Deadline-Seconds header, capped at REPORT_DEADLINE_SECONDS, which is also
+the default and sits below gunicorn's 300 s timeout). As the budget runs
+short the pipeline degrades, always in the same order:
+
+1. ai_summaries  - skip the Gemini suggestion summaries
+2. vector_charts - draw charts straight into the PDF instead of rendering PNGs
+3. tables_only   - leave charts out, keep the summary tables
+
+The level only goes up within a request. It is raised when a share of the
+budget has been used, or earlier when the time per report group so far
+projects past the deadline. What was degraded comes back in the
+X-Degraded header and as degradations.json in the report ZIP.
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+REPORT_DEADLINE_SECONDS = float(os.environ.get('REPORT_DEADLINE_SECONDS', 240))
+DEGRADATION_STEPS = ('ai_summaries', 'vector_charts', 'tables_only')
+# (level, share of the budget used, projected total / budget) at which a level starts
+LEVEL_THRESHOLDS = ((1, 0.5, 1.0), (2, 0.7, 1.4), (3, 0.85, 2.0))
+# Most of the remaining time one Gemini call may take
+LLM_SHARE = 0.5
+
+_local = threading.local()
+
+
+class LatencyBudget:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._t0 = time.perf_counter()
+        self.level = 0
+        self.degraded = {}
+        self._progress = None
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def remaining(self):
+        return self.seconds - self.elapsed()
+
+    def note_progress(self, done, total):
+        """Report groups done out of total so far, for projecting the finish time"""
+        if done == 0 or self._progress is None:
+            self._progress = (self.elapsed(), done, total)
+        else:
+            self._progress = (self._progress[0], done, total)
+
+    def projected(self):
+        """Expected total seconds at the current pace, or None before the first group is done"""
+        if not self._progress or not self._progress[1]:
+            return None
+        started, done, total = self._progress
+        elapsed = self.elapsed()
+        return elapsed + (elapsed - started) / done * (total - done)
+
+    def update_level(self):
+        used = self.elapsed() / self.seconds
+        projected = self.projected()
+        for level, used_share, projected_share in LEVEL_THRESHOLDS:
+            if used >= used_share or (projected is not None and projected / self.seconds >= projected_share):
+                self.level = max(self.level, level)
+        return self.level
+
+    def record(self, step):
+        entry = self.degraded.setdefault(step, {'step': step, 'count': 0, 'first_at_seconds': round(self.elapsed(), 2)})
+        entry['count'] += 1
+
+    def should_degrade(self, step):
+        if self.update_level() > DEGRADATION_STEPS.index(step):
+            self.record(step)
+            return True
+        return False
+
+    def to_doc(self):
+        return {
+            'budget_seconds': self.seconds,
+            'elapsed_seconds': round(self.elapsed(), 2),
+            'level': self.level,
+            'degraded': [self.degraded[step] for step in DEGRADATION_STEPS if step in self.degraded],
+        }
+
+
+def current_budget():
+    return getattr(_local, 'budget', None)
+
+
+def should_degrade(step):
+    """Whether to apply a degradation step now (and record it); False outside a budgeted request"""
+    budget = current_budget()
+    return budget is not None and budget.should_degrade(step)
+
+
+def record_degradation(step):
+    budget = current_budget()
+    if budget is not None:
+        budget.record(step)
+
+
+def note_progress(done, total):
+    budget = current_budget()
+    if budget is not None:
+        budget.note_progress(done, total)
+
+
+def llm_time_limit():
+    """Seconds one Gemini call may take within the budget, or None without one"""
+    budget = current_budget()
+    if budget is None:
+        return None
+    return max(1.0, budget.remaining() * LLM_SHARE)
+
+
+def requested_seconds(request):
+    value = request.form.get('deadlineSeconds') or request.headers.get('X-Deadline-Seconds')
+    try:
+        seconds = float(value) if value else REPORT_DEADLINE_SECONDS
+    except ValueError:
+        seconds = REPORT_DEADLINE_SECONDS
+    if not math.isfinite(seconds):
+        seconds = REPORT_DEADLINE_SECONDS
+    return min(max(seconds, 1.0), REPORT_DEADLINE_SECONDS)
+
+
+def degradations_json():
+    """degradations.json contents for the current request, or None when nothing was degraded"""
+    budget = current_budget()
+    if budget is None or not budget.degraded:
+        return None
+    return json.dumps(budget.to_doc(), indent=2)
+
+
+def latency_budgeted(view):
+    """Route decorator: run the view under a latency budget and list what was degraded in X-Degraded"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import make_response, request
+        budget = LatencyBudget(requested_seconds(request))
+        _local.budget = budget
+        try:
+            response = make_response(view(*args, **kwargs))
+        finally:
+            _local.budget = None
+        if budget.degraded:
+            response.headers['X-Degraded'] = ','.join(step for step in DEGRADATION_STEPS if step in budget.degraded)
+            print(f"⏱️ Degraded report to fit {budget.seconds:.0f}s: {response.headers['X-Degraded']}")
+        return response
+    return wrapper
@@ -0,0 +1,70 @@
+"""
+Reusable matplotlib figures for chart rendering.
+
+Charts are drawn with the object-oriented Figure API rather than pyplot, so no
+global figure state is shared between threads. Finished figures go back to a
+small per-worker pool and are cleared for the next chart instead of being
+rebuilt from scratch.
+"""
+import threading
+from contextlib import contextmanager
+
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+FIGURE_POOL_SIZE = 4
+SUBPLOT_PARAMS = ('left', 'right', 'bottom', 'top', 'wspace', 'hspace')
+
+
+class FigurePool:
+    """Hands out one figure per caller at a time and keeps up to max_size idle ones"""
+
+    def __init__(self, max_size=FIGURE_POOL_SIZE):
+        self.max_size = max_size
+        self.created = 0
+        self.reused = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self, figsize):
+        with self._lock:
+            fig = self._idle.pop() if self._idle else None
+            if fig is None:
+                self.created += 1
+            else:
+                self.reused += 1
+        if fig is None:
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+        else:
+            fig.set_size_inches(figsize)
+        return fig
+
+    def release(self, fig):
+        # Drop every axes and artist and undo margin tweaks, keep the figure and its canvas
+        fig.clear()
+        fig.subplotpars.update(**{name: rcParams[f'figure.subplot.{name}'] for name in SUBPLOT_PARAMS})
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append(fig)
+
+    def clear(self):
+        with self._lock:
+            self._idle = []
+
+
+_figures = FigurePool()
+
+
+@contextmanager
+def pooled_figure(figsize):
+    fig = _figures.acquire(figsize)
+    try:
+        yield fig
+    finally:
+        _figures.release(fig)
+
+
+def clear_figure_pool():
+    _figures.clear()
@@ -1,5 +1,14 @@
 # Gunicorn configuration file
 import multiprocessing
+import os
+import shutil
+
+# Workers write Prometheus samples here so /metrics can aggregate all of them.
+# Set up (and emptied) here because preload_app imports the app, and with it
+# prometheus_client, before any server hook runs.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/dev/shm/feedback-catalyst-metrics")
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
 
 # Server socket
 bind = "0.0.0.0:5001"
@@ -11,6 +20,7 @@ worker_class = "sync"
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
+# Workers never share the master's MongoDB client: each builds its own pool after fork (database.py)
 preload_app = True
 
 # Timeout settings
@@ -39,6 +49,16 @@ user = None
 group = None
 tmp_upload_dir = None
 
+# Server hooks
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_fork(server, worker):
+    # Pay the first-chart costs (fonts, plotting imports, PDF fonts) before taking requests
+    from warmup import warm_up_rendering
+    warm_up_rendering()
+
 # SSL (if needed)
 # keyfile = None
 # certfile = None
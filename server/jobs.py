@@ -0,0 +1,278 @@
+"""
+Cooperative cancellation of report and suggestion jobs.
+
+Each request to a job endpoint gets a job id (the X-Job-ID request header
+if it looks like an id, else the trace's request id; echoed in the
+response) and a cancellation token. The pipeline checks the token between
+files, report groups, categories and charts, before writing a PDF, and
+while it waits on Gemini, and stops with JobCancelled once it is set.
+
+A job is cancelled when its client goes away or through
+DELETE /jobs/<job_id>. The work runs before the response starts, so a
+disconnect is noticed by peeking at the client socket (gunicorn and the
+Werkzeug dev server expose it), not by a failed write. DELETE may reach any
+worker: it marks the job in Mongo's jobs collection and the worker running
+it polls for that every JOB_POLL_SECONDS. A cancelled request ends with
+499, usually well within a second; a single chart render or PDF write in
+progress is not interrupted.
+"""
+import functools
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime
+
+import database
+from metrics import JOBS_CANCELLED
+from tracing import REQUEST_ID_PATTERN, current_request_id
+
+# How often a running job looks for a disconnect or a DELETE
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 0.5))
+# nginx's "client closed request"
+CLIENT_CLOSED_REQUEST = 499
+
+_local = threading.local()
+# job id -> token, for jobs running in this process
+_running = {}
+_running_lock = threading.Lock()
+
+
+class JobCancelled(BaseException):
+    """
+    Raised inside a cancelled job. A BaseException, like KeyboardInterrupt, so
+    the pipeline's `except Exception` fallbacks (skip a bad file, use a canned
+    summary) let it through.
+    """
+
+
+def client_disconnected(sock):
+    """True once the client has closed its end of the connection; peeks, never consumes request data"""
+    if sock is None:
+        return False
+    try:
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        if not poller.poll(0):
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+def _jobs():
+    db = database.db
+    return db['jobs'] if db is not None else None
+
+
+def _record(job_id, fields):
+    jobs = _jobs()
+    if jobs is None:
+        return
+    try:
+        jobs.update_one({'_id': job_id}, {'$set': fields}, upsert=True)
+    except Exception as e:
+        print(f"⚠️ Could not record job {job_id}: {e}")
+
+
+def cancel_requested(job_id):
+    jobs = _jobs()
+    if jobs is None:
+        return False
+    try:
+        return jobs.count_documents({'_id': job_id, 'cancel_requested': True}, limit=1) > 0
+    except Exception as e:
+        print(f"⚠️ Could not check job {job_id}: {e}")
+        return False
+
+
+class CancellationToken:
+    def __init__(self, job_id, client_socket=None, poll_seconds=JOB_POLL_SECONDS):
+        self.job_id = job_id
+        self.client_socket = client_socket
+        self.poll_seconds = poll_seconds
+        self.reason = None
+        self._event = threading.Event()
+        self._next_poll = 0.0
+
+    def cancel(self, reason):
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if now >= self._next_poll:
+            self._next_poll = now + self.poll_seconds
+            self.poll()
+        return self._event.is_set()
+
+    def poll(self):
+        """Look for a reason to cancel; runs at most every poll_seconds"""
+        if client_disconnected(self.client_socket):
+            self.cancel('client_disconnected')
+        elif cancel_requested(self.job_id):
+            self.cancel('cancel_requested')
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.reason)
+
+
+def current_token():
+    return getattr(_local, 'token', None)
+
+
+def check_cancelled():
+    """Raise JobCancelled if this thread's job was cancelled; no-op outside a job"""
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def _start_call(func, args, kwargs):
+    """
+    Run func in a daemon thread of its own. Not a shared pool: a call nobody
+    waits for any more keeps its thread until it returns, and must not hold up
+    the calls after it.
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name='job-call', daemon=True).start()
+    return future
+
+
+def run_cancellable(func, *args, timeout=None, **kwargs):
+    """
+    Call func in a helper thread and wait for it while watching this thread's
+    token, so a cancelled job stops waiting on e.g. a slow Gemini call (the
+    call itself runs to completion in the background). With a timeout, stops
+    waiting after that many seconds and raises TimeoutError. Outside a job and
+    without a timeout, just calls func.
+    """
+    token = current_token()
+    if token is None and timeout is None:
+        return func(*args, **kwargs)
+    if token is not None:
+        token.raise_if_cancelled()
+    future = _start_call(func, args, kwargs)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        wait = token.poll_seconds if token is not None else timeout
+        if deadline is not None:
+            wait = min(wait, max(0.0, deadline - time.monotonic()))
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeout:
+            if token is not None:
+                token.raise_if_cancelled()
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"gave up after {timeout:.1f}s")
+
+
+@contextmanager
+def running_job(token, endpoint):
+    """Run the block as this thread's job: record it, make token current and record how it ended"""
+    job_id = token.job_id
+    _record(job_id, {
+        'status': 'running', 'endpoint': endpoint, 'pid': os.getpid(),
+        'started_at': datetime.utcnow(), 'finished_at': None, 'cancel_requested': False, 'reason': None,
+    })
+    with _running_lock:
+        _running[job_id] = token
+    _local.token = token
+    status = 'failed'
+    try:
+        yield token
+        status = 'finished'
+    except JobCancelled as e:
+        status = 'cancelled'
+        JOBS_CANCELLED.labels(str(e)).inc()
+        print(f"🛑 Job {job_id} cancelled ({e})")
+        raise
+    finally:
+        _local.token = None
+        with _running_lock:
+            _running.pop(job_id, None)
+        _record(job_id, {'status': status, 'finished_at': datetime.utcnow(), 'reason': token.reason})
+
+
+def cancellable_job(view):
+    """Route decorator: run the view as a cancellable job; a cancelled job answers 499"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import jsonify, make_response, request
+        job_id = request.headers.get('X-Job-ID', '')
+        if not REQUEST_ID_PATTERN.match(job_id):
+            job_id = current_request_id() or uuid.uuid4().hex
+        sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+        try:
+            with running_job(CancellationToken(job_id, sock), request.endpoint):
+                response = make_response(view(*args, **kwargs))
+        except JobCancelled as e:
+            response = make_response(jsonify({"error": "Job cancelled", "reason": str(e), "job_id": job_id}), CLIENT_CLOSED_REQUEST)
+        response.headers['X-Job-ID'] = job_id
+        return response
+    return wrapper
+
+
+def _job_doc(doc):
+    return {
+        'job_id': doc['_id'],
+        'status': doc.get('status'),
+        'endpoint': doc.get('endpoint'),
+        'cancel_requested': doc.get('cancel_requested', False),
+        'reason': doc.get('reason'),
+        'started_at': doc['started_at'].isoformat() if doc.get('started_at') else None,
+        'finished_at': doc['finished_at'].isoformat() if doc.get('finished_at') else None,
+    }
+
+
+def init_app(app):
+    from flask import jsonify
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        jobs = _jobs()
+        if jobs is None:
+            return jsonify({"error": "Database connection not available"}), 500
+        doc = jobs.find_one({'_id': job_id})
+        if doc is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(_job_doc(doc))
+
+    @app.route('/jobs/<job_id>', methods=['DELETE'])
+    def cancel_job(job_id):
+        jobs = _jobs()
+        if jobs is None:
+            return jsonify({"error": "Database connection not available"}), 500
+        doc = jobs.find_one_and_update(
+            {'_id': job_id, 'status': 'running'}, {'$set': {'cancel_requested': True}}
+        )
+        if doc is None:
+            doc = jobs.find_one({'_id': job_id})
+            if doc is None:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify({"error": "Job already finished", **_job_doc(doc)}), 409
+        # A job in this worker stops at its next check; others notice on their next poll
+        with _running_lock:
+            token = _running.get(job_id)
+        if token is not None:
+            token.cancel('cancel_requested')
+        print(f"🛑 Cancellation requested for job {job_id}")
+        return jsonify({"job_id": job_id, "status": "cancelling"}), 202
@@ -0,0 +1,156 @@
+"""
+Prometheus metrics for the report pipeline.
+
+Each pipeline stage (parse, Likert detection, aggregation, chart render,
+GridFS put/get, LLM call, PDF layout, PDF output, ZIP) is timed with stage()
+or @timed_stage into one latency histogram labelled by stage. Requests get
+their own latency histogram and memory gauges, labelled by endpoint and
+feedback type.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) makes every
+worker write its samples to shared files, and GET /metrics aggregates them, so
+any worker can answer for all of them. Started with `python app.py` there is one
+process and the variable stays unset; /metrics then serves that process alone.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psutil
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+from tracing import span
+
+STAGES = (
+    'parse', 'likert_detection', 'aggregation', 'chart_render', 'gridfs_put', 'gridfs_get',
+    'llm_call', 'pdf_layout', 'pdf_output', 'zip'
+)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+REQUEST_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+STAGE_SECONDS = Histogram(
+    'feedback_stage_seconds', 'Time spent in each report pipeline stage', ['stage'], buckets=STAGE_BUCKETS
+)
+STAGE_ERRORS = Counter('feedback_stage_errors_total', 'Pipeline stages that raised', ['stage'])
+REQUEST_SECONDS = Histogram(
+    'feedback_request_seconds', 'Request latency', ['endpoint', 'feedback_type', 'status'], buckets=REQUEST_BUCKETS
+)
+REQUEST_RSS_BYTES = Gauge(
+    'feedback_request_rss_bytes', 'Worker RSS after the latest request', ['endpoint', 'feedback_type'],
+    multiprocess_mode='livemax'
+)
+REQUEST_RSS_GROWTH_BYTES = Histogram(
+    'feedback_request_rss_growth_bytes', 'Worker RSS growth during a request', ['endpoint', 'feedback_type'],
+    buckets=MEMORY_BUCKETS
+)
+ADMISSION_DECISIONS = Counter(
+    'feedback_admission_decisions_total', 'Admission decisions for expensive requests',
+    ['endpoint_class', 'priority', 'outcome']
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    'feedback_admission_wait_seconds', 'Time admitted requests waited for memory or a slot', ['endpoint_class', 'priority'],
+    buckets=(0.01, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+)
+# Machine-wide values read from the shared admission state; the last worker to update it wins
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'feedback_admission_queue_depth', 'Requests waiting for admission', ['priority'], multiprocess_mode='livemostrecent'
+)
+ADMISSION_RUNNING = Gauge(
+    'feedback_admission_running', 'Admitted requests still running', ['priority'], multiprocess_mode='livemostrecent'
+)
+JOBS_CANCELLED = Counter(
+    'feedback_jobs_cancelled_total', 'Report and suggestion jobs stopped before finishing', ['reason']
+)
+
+# Export every stage from the start, even before it first runs
+for _name in STAGES:
+    STAGE_SECONDS.labels(_name)
+
+_local = threading.local()
+_process = psutil.Process(os.getpid())
+_process_pid = os.getpid()
+
+
+def current_rss():
+    global _process, _process_pid
+    if os.getpid() != _process_pid:
+        _process, _process_pid = psutil.Process(os.getpid()), os.getpid()
+    return _process.memory_info().rss
+
+
+@contextmanager
+def unrecorded():
+    """Run a block without recording stage metrics or spans in this thread, e.g. synthetic warm-up work"""
+    previous = getattr(_local, 'unrecorded', False)
+    _local.unrecorded = True
+    try:
+        yield
+    finally:
+        _local.unrecorded = previous
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one pipeline stage (and as a span of the current request trace)"""
+    if getattr(_local, 'unrecorded', False):
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    except Exception:
+        # Cancelled jobs (JobCancelled) are counted by feedback_jobs_cancelled_total instead
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def timed_stage(name):
+    """Decorator form of stage()"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Time every request and serve GET /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_rss = current_rss()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.endpoint in ('metrics', 'get_trace', 'list_traces'):
+            return response
+        endpoint = request.endpoint or 'unknown'
+        # Only look at the form if the handler already parsed it (never parse a rejected upload here)
+        form = request.__dict__.get('form')
+        feedback_type = form.get('feedbackType', 'stakeholder') if form is not None and request.method == 'POST' else ''
+        REQUEST_SECONDS.labels(endpoint, feedback_type, str(response.status_code)).observe(time.perf_counter() - started)
+        rss = current_rss()
+        REQUEST_RSS_BYTES.labels(endpoint, feedback_type).set(rss)
+        REQUEST_RSS_GROWTH_BYTES.labels(endpoint, feedback_type).observe(max(0, rss - g.pop('metrics_rss', rss)))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,116 @@
+"""
+Connection pool monitoring for the MongoDB client.
+
+Records how long each request thread waits to check a connection out of
+PyMongo's pool. Checkout happens synchronously in the calling thread, so the
+start time is kept in a thread-local and matched with the checked-out (or
+failed) event that follows it.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from pymongo import monitoring
+
+# Checkouts slower than this are logged
+SLOW_CHECKOUT_MS = float(os.environ.get('MONGO_SLOW_CHECKOUT_MS', 100))
+# Waits kept for percentiles
+WAIT_SAMPLES = 1000
+
+
+class PoolWaitMonitor(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._started = threading.local()
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.checkouts = 0
+        self.failures = 0
+        self.slow_checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.connections_created = 0
+        self.pool_clears = 0
+
+    def _finish(self, failed=False, reason=None):
+        started = getattr(self._started, 'at', None)
+        if started is None:
+            return
+        self._started.at = None
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._waits.append(wait_ms)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            if failed:
+                self.failures += 1
+            else:
+                self.checkouts += 1
+            if wait_ms >= SLOW_CHECKOUT_MS:
+                self.slow_checkouts += 1
+        if failed:
+            print(f"❌ MongoDB pool checkout failed after {wait_ms:.0f} ms: {reason}")
+        elif wait_ms >= SLOW_CHECKOUT_MS:
+            print(f"⚠️  Slow MongoDB pool checkout: waited {wait_ms:.0f} ms (pid {os.getpid()})")
+
+    def connection_check_out_started(self, event):
+        self._started.at = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        self._finish()
+
+    def connection_check_out_failed(self, event):
+        self._finish(failed=True, reason=event.reason)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    # Events we don't need
+    def connection_checked_in(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            attempts = self.checkouts + self.failures
+            return {
+                'checkouts': self.checkouts,
+                'failures': self.failures,
+                'slow_checkouts': self.slow_checkouts,
+                'connections_created': self.connections_created,
+                'pool_clears': self.pool_clears,
+                'wait_ms': {
+                    'mean': round(self.total_wait_ms / attempts, 3) if attempts else 0.0,
+                    'p50': _percentile(waits, 50),
+                    'p95': _percentile(waits, 95),
+                    'p99': _percentile(waits, 99),
+                    'max': round(self.max_wait_ms, 3)
+                }
+            }
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return round(values[index], 3)
@@ -0,0 +1,113 @@
+"""
+Speculative precomputation after an upload.
+
+Between /upload and the user's first "View charts" or "Generate" click there
+are usually tens of seconds of idle time. With PRECOMPUTE_AFTER_UPLOAD=1 the
+worker that stored an upload spends them in a background thread: it parses
+the profiled columns into the dataset cache, builds the rating
+summaries of the UI's default views (overall, and per group when the
+profile found a group column), saves their chart specs and renders the
+preview PNGs. The chart and report requests that follow then find warm
+caches; chart names are content-addressed, so a view asked for with the
+same inputs reuses the stored PNGs.
+
+The work is strictly best effort. The thread runs niced, holds a
+'background' admission ticket (granted only when nothing else is waiting
+and at most ADMISSION_MAX_BACKGROUND at once) and is a cancellable job
+(precompute-<file_id>): it stops between charts as soon as any request is
+queued for admission, on DELETE /jobs/<id>, or after PRECOMPUTE_MAX_SECONDS.
+"""
+import os
+import threading
+import time
+
+from admission import AdmissionRejected, controller, estimate_cost_mb
+from datasets import load_dataset
+from jobs import CancellationToken, JobCancelled, check_cancelled, running_job
+
+PRECOMPUTE_AFTER_UPLOAD = os.environ.get('PRECOMPUTE_AFTER_UPLOAD', '0') == '1'
+PRECOMPUTE_MAX_SECONDS = float(os.environ.get('PRECOMPUTE_MAX_SECONDS', 60))
+# Added to the thread's nice value (Linux schedules threads individually)
+PRECOMPUTE_NICE = int(os.environ.get('PRECOMPUTE_NICE', 10))
+# (choice, reportType) of the views the UI offers: overall and field-wise
+PRECOMPUTE_VIEWS = (('1', 'generalized'), ('2', 'fieldwise'))
+
+
+class PrecomputeToken(CancellationToken):
+    """Also cancelled by a busy box or by running too long"""
+
+    def __init__(self, job_id, max_seconds=PRECOMPUTE_MAX_SECONDS):
+        super().__init__(job_id)
+        self.deadline = time.monotonic() + max_seconds
+
+    def poll(self):
+        if time.monotonic() >= self.deadline:
+            self.cancel('timeout')
+        elif controller.waiting():
+            self.cancel('box_busy')
+        else:
+            super().poll()
+
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PRECOMPUTE_NICE)
+    except (AttributeError, OSError) as e:
+        print(f"⚠️ Could not lower precompute thread priority: {e}")
+
+
+def precompute_upload(meta, feedback_type='stakeholder'):
+    """Warm the caches for one stored upload"""
+    from feedback_processor import process_for_charts, profile_columns, render_missing_charts
+    profile = meta['profile']
+    # /upload only profiled the file; this is its first full parse
+    df = load_dataset(meta, profile_columns(profile, '2'))
+    # Same chart names /generate-charts uses for stored uploads
+    chart_name = meta['filename'] if feedback_type == 'stakeholder' else os.path.splitext(meta['filename'])[0]
+    started = time.perf_counter()
+    charts = 0
+    for choice, report_type in PRECOMPUTE_VIEWS:
+        if choice == '2' and not profile.get('group_column'):
+            continue
+        check_cancelled()
+        filenames = process_for_charts(df, choice, feedback_type, chart_name, report_type, profile=profile, lazy=True)
+        render_missing_charts(filenames)
+        charts += len(filenames)
+    print(f"🔥 Precomputed {charts} charts for {meta['filename']} in {time.perf_counter() - started:.1f}s")
+
+
+def _run(meta, feedback_type, token):
+    try:
+        with running_job(token, 'precompute'):
+            _lower_priority()
+            try:
+                ticket = controller.acquire('light', estimate_cost_mb('light', [meta['profile']], '2'), 'background', 'precompute')
+            except AdmissionRejected as e:
+                print(f"⏭️ Skipping precompute for {meta['filename']}: {e}")
+                token.cancel('box_busy')
+                raise JobCancelled(token.reason)
+            try:
+                precompute_upload(meta, feedback_type)
+            finally:
+                controller.release(ticket)
+    except JobCancelled:
+        pass
+    except Exception as e:
+        print(f"⚠️ Precompute failed for {meta['filename']}: {e}")
+
+
+def schedule(meta, feedback_type=None):
+    """
+    Start precomputing a freshly stored upload in the background; returns the job id,
+    or None when off or when the upload did not say which feedback type it is for
+    (guessing would warm charts under names the later requests never ask for)
+    """
+    if not PRECOMPUTE_AFTER_UPLOAD or not meta.get('profile'):
+        return None
+    if feedback_type not in ('stakeholder', 'subject'):
+        return None
+    token = PrecomputeToken(f"precompute-{meta['file_id']}")
+    threading.Thread(
+        target=_run, args=(meta, feedback_type, token), name=token.job_id, daemon=True
+    ).start()
+    return token.job_id
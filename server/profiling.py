@@ -0,0 +1,244 @@
+"""
+On-demand profiling of a single request.
+
+Any request can ask to be profiled by sending the admin token from
+PROFILE_TOKEN, either as the X-Profile header or the __profile query
+parameter. Without PROFILE_TOKEN set, profiling is off and the flag is
+ignored. Two modes are available (X-Profile-Mode / __profile_mode):
+
+- cprofile (default): deterministic profile of the request thread, saved
+  as a pstats file plus a text summary.
+- sample: a background thread samples the request thread's stack every
+  PROFILE_SAMPLE_MS, saved as collapsed stacks ready for flamegraph.pl or
+  speedscope. Much lower overhead, better for long reports.
+
+Both modes also record tracemalloc allocations made during the request.
+The results are stored in the fs_profiles GridFS bucket and the response
+carries an X-Profile-URL header pointing at GET /profiles/<profile_id>.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+import database
+from tracing import current_request_id
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_MS = float(os.environ.get('PROFILE_SAMPLE_MS', 5))
+PROFILE_MODES = ('cprofile', 'sample')
+# Frames kept per tracemalloc traceback
+TRACEMALLOC_FRAMES = 10
+SUMMARY_LINES = 40
+# Files stored per profile: kind -> (file suffix, content type)
+PROFILE_FILES = {
+    'summary': ('txt', 'text/plain'),
+    'pstats': ('pstats', 'application/octet-stream'),
+    'collapsed': ('collapsed', 'text/plain'),
+    'memory': ('memory.txt', 'text/plain'),
+}
+
+# One profiled request at a time per worker: profilers and tracemalloc are process-wide costs
+_active = threading.Lock()
+
+
+def is_authorized(token):
+    return bool(PROFILE_TOKEN) and bool(token) and hmac.compare_digest(token.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+
+class StackSampler:
+    """Sample one thread's Python stack on a timer, counting collapsed stacks"""
+
+    def __init__(self, thread_id, interval_ms=PROFILE_SAMPLE_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    def __init__(self, mode):
+        self.mode = mode
+        self.profile_id = uuid.uuid4().hex
+        self._profiler = None
+        self._sampler = None
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self._started = None
+        self.duration = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._started = time.perf_counter()
+        if self.mode == 'sample':
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """Stop profiling and return the output files (kind -> bytes)"""
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self.duration = time.perf_counter() - self._started
+        files = {'memory': self._memory_report().encode('utf-8')}
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        summary = io.StringIO()
+        summary.write(f"mode={self.mode} duration={self.duration:.3f}s pid={os.getpid()}\n\n")
+        if self._profiler is not None:
+            stats = pstats.Stats(self._profiler, stream=summary)
+            stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+            stats.dump_stats(self._dump_path())
+            with open(self._dump_path(), 'rb') as f:
+                files['pstats'] = f.read()
+            os.unlink(self._dump_path())
+        else:
+            files['collapsed'] = self._sampler.collapsed().encode('utf-8')
+            summary.write(f"{self._sampler.samples} samples every {PROFILE_SAMPLE_MS:g} ms; hottest stacks:\n\n")
+            for stack, count in self._sampler.stacks.most_common(SUMMARY_LINES):
+                summary.write(f"{count:>6}  {';'.join(stack.split(';')[-4:])}\n")
+        files['summary'] = summary.getvalue().encode('utf-8')
+        return files
+
+    def _dump_path(self):
+        # pstats only dumps to a path
+        return os.path.join(tempfile.gettempdir(), f"profile-{self.profile_id}.pstats")
+
+    def _memory_report(self):
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        lines = [f"traced memory now {current / 1024 / 1024:.1f} MB, peak during request {peak / 1024 / 1024:.1f} MB", '',
+                 'Top allocation growth by line:']
+        for stat in after.compare_to(self._snapshot, 'lineno')[:SUMMARY_LINES]:
+            lines.append(str(stat))
+        return '\n'.join(lines) + '\n'
+
+
+def store_profile(profile, files, metadata):
+    fs_profiles = database.fs_profiles
+    if fs_profiles is None:
+        raise RuntimeError("MongoDB not available")
+    for kind, data in files.items():
+        suffix, content_type = PROFILE_FILES[kind]
+        fs_profiles.put(
+            data, filename=f"{profile.profile_id}.{suffix}", content_type=content_type,
+            metadata=dict(metadata, profile_id=profile.profile_id, kind=kind)
+        )
+
+
+def init_app(app):
+    """Profile requests that carry the admin token and serve GET /profiles/<profile_id>"""
+    from flask import Response, g, jsonify, request, url_for
+
+    def requested_token():
+        return request.headers.get('X-Profile') or request.args.get('__profile')
+
+    @app.before_request
+    def _start_profile():
+        token = requested_token()
+        if not token or not is_authorized(token) or request.endpoint in ('get_profile', 'get_trace', 'list_traces'):
+            return
+        mode = request.headers.get('X-Profile-Mode') or request.args.get('__profile_mode') or 'cprofile'
+        if mode not in PROFILE_MODES:
+            return jsonify({"error": f"Invalid profile mode; use one of {', '.join(PROFILE_MODES)}"}), 400
+        if not _active.acquire(blocking=False):
+            g.profile_error = "another request is being profiled in this worker"
+            return
+        g.profile = RequestProfile(mode)
+        g.profile.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            if g.get('profile_error'):
+                response.headers['X-Profile-Error'] = g.pop('profile_error')
+            return response
+        try:
+            files = profile.stop()
+        finally:
+            _active.release()
+        metadata = {
+            'method': request.method, 'path': request.path, 'endpoint': request.endpoint,
+            'status': response.status_code, 'mode': profile.mode,
+            'duration_seconds': round(profile.duration, 3), 'request_id': current_request_id(), 'pid': os.getpid()
+        }
+        try:
+            store_profile(profile, files, metadata)
+            response.headers['X-Profile-URL'] = url_for('get_profile', profile_id=profile.profile_id, _external=True)
+        except Exception as e:
+            print(f"⚠️ Could not store profile {profile.profile_id}: {e}")
+            response.headers['X-Profile-Error'] = f"profile not stored: {e}"
+        return response
+
+    @app.teardown_request
+    def _release_profile(error=None):
+        # The request failed before after_request ran
+        profile = g.pop('profile', None)
+        if profile is not None:
+            try:
+                profile.stop()
+            finally:
+                _active.release()
+
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def get_profile(profile_id):
+        """Summary of a stored profile; kind=pstats|collapsed|memory downloads the other files"""
+        if not is_authorized(requested_token()):
+            return jsonify({"error": "Not authorized"}), 403
+        kind = request.args.get('kind', 'summary')
+        if kind not in PROFILE_FILES:
+            return jsonify({"error": f"Unknown profile file; use one of {', '.join(PROFILE_FILES)}"}), 400
+        fs_profiles = database.fs_profiles
+        if fs_profiles is None:
+            return jsonify({"error": "MongoDB not available"}), 500
+        suffix, content_type = PROFILE_FILES[kind]
+        stored = fs_profiles.find_one({'filename': f"{profile_id}.{suffix}"})
+        if stored is None:
+            return jsonify({"error": "Profile not found"}), 404
+        response = Response(stored.read(), mimetype=content_type)
+        if kind != 'summary':
+            response.headers['Content-Disposition'] = f'attachment; filename="{stored.filename}"'
+        return response
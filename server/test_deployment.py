@@ -48,7 +48,8 @@ def test_gemini_api():
     
     try:
         import google.generativeai as genai
-        from feedback_processor import model
+        from feedback_processor import get_model
+        model = get_model()
         
         if model is None:
             print("❌ Gemini model not configured")
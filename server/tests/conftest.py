@@ -0,0 +1,73 @@
+"""
+Shared fixtures: an in-memory mongomock database per test, a stubbed Gemini
+SDK and a Flask test client. Run from the server directory with
+`python -m pytest -q`.
+"""
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+# Settings read at import time; scratch files (admission state, traces, report
+# PDFs) go to a throwaway directory instead of the checkout
+_scratch = tempfile.mkdtemp(prefix='feedback-tests-')
+os.environ['ADMISSION_STATE_FILE'] = os.path.join(_scratch, 'admission.json')
+os.environ['TRACE_FILE'] = os.path.join(_scratch, 'traces.jsonl')
+os.environ['PRECOMPUTE_AFTER_UPLOAD'] = '0'
+
+from benchmarks.stubs import use_mongomock, use_stub_llm  # noqa: E402
+
+use_mongomock()
+use_stub_llm()
+
+
+@pytest.fixture(autouse=True, scope='session')
+def scratch_dir():
+    cwd = os.getcwd()
+    os.chdir(_scratch)
+    yield _scratch
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def db():
+    """A fresh, empty mongomock database behind database.db"""
+    import database
+    from chart_cache import clear_hot_charts
+    from datasets import clear_dataset_cache
+    database._services.clear()
+    clear_hot_charts()
+    clear_dataset_cache()
+    yield database.db
+    database._services.clear()
+
+
+@pytest.fixture
+def client(db):
+    from app import app
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def make_feedback_df(rows=40, seed=0):
+    """A small stakeholder sheet: a group column, Likert questions in two categories and suggestions"""
+    rng = np.random.default_rng(seed)
+    data = {'Name': [f'Student {i}' for i in range(rows)], 'Branch': rng.choice(['CS', 'IT', 'AI & DS'], rows)}
+    for question in ['Teaching', 'Labs', 'Library']:
+        data[f'Curriculum [{question} quality]'] = rng.integers(1, 6, rows)
+    data['Facilities [Canteen]'] = rng.integers(1, 6, rows)
+    data['Any suggestions?'] = rng.choice(
+        ['More practical lab sessions', 'Better library books and more practical lab sessions', 'Improve canteen food quality'], rows
+    )
+    return pd.DataFrame(data)
+
+
+def csv_upload(df, filename='feedback.csv'):
+    return io.BytesIO(df.to_csv(index=False).encode()), filename
@@ -0,0 +1,131 @@
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected
+
+MB = admission.MB
+
+
+@pytest.fixture
+def controller(tmp_path, monkeypatch):
+    # 1000 MB budget, 100 MB in use before any request
+    monkeypatch.setattr(admission, 'memory_budget_bytes', lambda: 1000 * MB)
+    monkeypatch.setattr(admission, 'live_memory_bytes', lambda: 100 * MB)
+    classes = {
+        'light': {'max_concurrent': 4, 'queue_seconds': 0.3, 'base_mb': 30},
+        'heavy': {'max_concurrent': 1, 'queue_seconds': 0.3, 'base_mb': 80},
+    }
+    return AdmissionController(str(tmp_path / 'admission.json'), classes=classes)
+
+
+def test_waiters_start_in_priority_order(controller):
+    bulk = controller.enqueue('light', 10, 'bulk', 'a')
+    interactive = controller.enqueue('light', 10, 'interactive', 'b')
+
+    granted, reason = controller.try_acquire(bulk)
+    assert not granted and 'higher priority' in reason
+    assert controller.try_acquire(interactive) == (True, None)
+    assert controller.try_acquire(bulk) == (True, None)
+
+
+def test_client_with_fewer_running_requests_goes_first(controller):
+    controller.acquire('light', 10, 'standard', 'busy')
+    busy = controller.enqueue('light', 10, 'standard', 'busy')
+    idle = controller.enqueue('light', 10, 'standard', 'idle')
+
+    assert not controller.try_acquire(busy)[0]
+    assert controller.try_acquire(idle) == (True, None)
+    assert controller.try_acquire(busy) == (True, None)
+
+
+def test_same_priority_and_load_is_first_come_first_served(controller):
+    first = controller.enqueue('light', 10, 'standard', 'a')
+    second = controller.enqueue('light', 10, 'standard', 'b')
+    assert not controller.try_acquire(second)[0]
+    assert controller.try_acquire(first)[0]
+
+
+def test_class_limit_rejects_after_queue_time(controller):
+    ticket = controller.acquire('heavy', 10, 'standard', 'a')
+    with pytest.raises(AdmissionRejected, match='heavy requests already running'):
+        controller.acquire('heavy', 10, 'standard', 'b')
+    assert controller.waiting() == 0
+
+    controller.release(ticket)
+    controller.release(controller.acquire('heavy', 10, 'standard', 'b'))
+
+
+def test_bulk_limit_leaves_room_for_other_priorities(controller):
+    controller.acquire('light', 10, 'bulk', 'a')
+    with pytest.raises(AdmissionRejected, match='bulk requests already running'):
+        controller.acquire('light', 10, 'bulk', 'b')
+    controller.acquire('light', 10, 'interactive', 'c')
+
+
+def test_memory_budget_blocks_unless_nothing_runs(controller):
+    # Alone, even an oversized request is let through
+    big = controller.acquire('light', 2000, 'standard', 'a')
+    with pytest.raises(AdmissionRejected, match='projected'):
+        controller.acquire('light', 10, 'standard', 'b')
+    controller.release(big)
+    controller.acquire('light', 800, 'standard', 'b')
+    with pytest.raises(AdmissionRejected, match='needs 200 MB'):
+        controller.acquire('light', 200, 'standard', 'c')
+
+
+def test_background_never_waits_and_yields_to_queued_requests(controller):
+    controller.enqueue('light', 10, 'standard', 'a')
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('light', 10, 'background', 'precompute')
+    assert controller.waiting() == 1
+
+
+def test_snapshot_counts_running_and_waiting(controller):
+    controller.acquire('heavy', 50, 'standard', 'a')
+    controller.enqueue('light', 10, 'interactive', 'b')
+    snapshot = controller.snapshot()
+    assert snapshot['running'] == {'light': 0, 'heavy': 1}
+    assert snapshot['reserved_mb'] == 50
+    assert snapshot['waiting_by_priority']['interactive'] == 1
+    assert snapshot['waiting_clients'] == 1
+
+
+def test_cost_estimate_scales_with_cells_and_groups():
+    profile = {'row_count': 10000, 'likert_columns': ['q'] * 10, 'group_count': 4}
+    overall = admission.estimate_cost_mb('heavy', [profile], '1')
+    per_group = admission.estimate_cost_mb('heavy', [profile], '2')
+    base = admission.ENDPOINT_CLASSES['heavy']['base_mb']
+    assert per_group - base == pytest.approx(4 * (overall - base), abs=0.2)
+    assert admission.estimate_cost_mb('light', upload_bytes=MB) == admission.ENDPOINT_CLASSES['light']['base_mb'] + admission.ADMISSION_UPLOAD_FACTOR
+
+
+def test_streamed_response_holds_its_ticket_until_closed(controller, monkeypatch):
+    from flask import Flask, Response
+
+    monkeypatch.setattr(admission, 'controller', controller)
+    app = Flask(__name__)
+    running = []
+
+    @app.route('/stream')
+    @admission.admission_controlled('light', lambda: 10, 'interactive')
+    def stream():
+        def body():
+            running.append(controller.snapshot()['running']['light'])
+            yield b'chunk'
+        return Response(body())
+
+    @app.route('/plain')
+    @admission.admission_controlled('light', lambda: 10, 'interactive')
+    def plain():
+        return 'done'
+
+    client = app.test_client()
+    response = client.get('/stream', buffered=False)
+    assert controller.snapshot()['running']['light'] == 1
+    assert response.get_data() == b'chunk'
+    response.close()
+    assert running == [1]
+    assert controller.snapshot()['running']['light'] == 0
+
+    assert client.get('/plain').data == b'done'
+    assert controller.snapshot()['running']['light'] == 0
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from benchmarks import run
+from benchmarks.survey import make_survey
+from feedback_processor import profile_dataframe
+
+
+def test_same_arguments_and_seed_give_the_same_survey():
+    assert make_survey(rows=50, seed=3).equals(make_survey(rows=50, seed=3))
+    assert not make_survey(rows=50, seed=3).equals(make_survey(rows=50, seed=4))
+
+
+@pytest.mark.parametrize('layout', ['stakeholder', 'subject'])
+def test_survey_profiles_as_the_requested_shape(layout):
+    survey = make_survey(rows=120, likert_columns=8, categories=4, groups=3, layout=layout)
+    profile = profile_dataframe(survey)
+    assert profile['row_count'] == 120
+    assert len(profile['likert_columns']) == 8
+    assert profile['group_column'] == ('Branch' if layout == 'stakeholder' else 'Department')
+    assert profile['group_count'] == 3
+    assert profile['suggestion_column'] == 'Any suggestions for improvement?'
+    if layout == 'stakeholder':
+        assert len(profile['category_groups']) == 4
+
+
+def test_survey_without_suggestions_or_with_unknown_layout():
+    assert profile_dataframe(make_survey(rows=20, suggestion_words=0))['suggestion_column'] is None
+    with pytest.raises(ValueError, match='Unknown layout'):
+        make_survey(layout='alumni')
+
+
+def test_run_writes_results_and_flags_regressions(tmp_path):
+    output = tmp_path / 'results.json'
+    args = ['--rows', '30', '--likert', '4', '--categories', '2', '--groups', '2',
+            '--only', 'parse_csv', '--repeats', '1', '--warmup', '0', '--output', str(output)]
+    assert run.main(args) == 0
+    results = json.loads(output.read_text())
+    assert list(results['results']) == ['parse_csv']
+    assert results['survey']['rows'] == 30
+
+    # A baseline ten times faster than this run
+    baseline = tmp_path / 'baseline.json'
+    results['results']['parse_csv']['median_s'] /= 10
+    baseline.write_text(json.dumps(results))
+    assert run.main(args + ['--compare', str(baseline)]) == 1
@@ -0,0 +1,51 @@
+from cache import LRUCache
+
+
+def test_evicts_least_recently_used_by_count():
+    cache = LRUCache(max_items=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a is now the most recent
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_evicts_by_total_bytes():
+    cache = LRUCache(max_items=10, max_bytes=10)
+    cache.put('a', b'xxxx')
+    cache.put('b', b'yyyy')
+    cache.put('c', b'zzzz')
+    assert 'a' not in cache and len(cache) == 2
+    assert cache.total_bytes == 8
+
+
+def test_replacing_an_entry_updates_its_size():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', b'xxxxxxxx')
+    cache.put('a', b'x')
+    assert cache.total_bytes == 1
+    cache.put('b', b'yyyyyyyyy')
+    assert 'a' in cache and cache.total_bytes == 10
+
+
+def test_oversized_entry_is_refused_and_drops_the_stale_copy():
+    cache = LRUCache(max_bytes=10)
+    cache.put('keep', b'12345')
+    cache.put('big', b'old')
+    assert cache.put('big', b'x' * 11) is False
+    assert 'big' not in cache
+    assert cache.get('keep') == b'12345'
+    assert cache.total_bytes == 5
+
+
+def test_custom_sizeof_hits_misses_pop_and_clear():
+    cache = LRUCache(max_bytes=100, sizeof=lambda entry: entry['size'])
+    cache.put('a', {'size': 60})
+    assert cache.get('missing', 'default') == 'default'
+    assert cache.get('a') == {'size': 60}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.pop('a') == {'size': 60} and cache.total_bytes == 0
+    cache.put('b', {'size': 10})
+    cache.clear()
+    assert len(cache) == 0 and cache.total_bytes == 0
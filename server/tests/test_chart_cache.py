@@ -0,0 +1,63 @@
+import io
+import json
+import zipfile
+
+import gridfs
+import mongomock
+import pytest
+
+import chart_cache
+from chart_cache import stream_chart_bundle
+
+
+@pytest.fixture
+def fs():
+    chart_cache.clear_hot_charts()
+    yield gridfs.GridFS(mongomock.MongoClient()['charts_test'], collection='charts')
+    chart_cache.clear_hot_charts()
+
+
+def read_bundle(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_bundle_has_newest_version_of_each_chart_and_a_manifest(fs):
+    fs.put(b'old a', filename='a.png')
+    newest = fs.put(b'new a', filename='a.png')
+    fs.put(b'png b', filename='b.png')
+
+    bundle = read_bundle(stream_chart_bundle(fs, ['b.png', 'a.png', 'gone.png', 'b.png'], lambda name: f'/charts/{name}'))
+    assert bundle.namelist() == ['b.png', 'a.png', 'manifest.json']
+    assert bundle.read('a.png') == b'new a'
+    assert all(info.compress_type == zipfile.ZIP_STORED for info in bundle.infolist())
+
+    manifest = json.loads(bundle.read('manifest.json'))
+    assert [chart['filename'] for chart in manifest['charts']] == ['b.png', 'a.png']
+    assert manifest['charts'][1] == {'filename': 'a.png', 'etag': str(newest), 'size': 5, 'url': '/charts/a.png'}
+    assert manifest['missing'] == ['gone.png']
+
+
+def test_bundle_streams_one_chunk_per_chart(fs):
+    for name in ('a.png', 'b.png', 'c.png'):
+        fs.put(name.encode() * 100, filename=name)
+    chunks = list(stream_chart_bundle(fs, ['a.png', 'b.png', 'c.png']))
+    # One chunk per chart, then the manifest and central directory
+    assert len(chunks) == 4
+    assert 'url' not in json.loads(read_bundle(chunks).read('manifest.json'))['charts'][0]
+
+
+def test_bundle_serves_hot_charts_from_the_cache_and_warms_it(fs):
+    chart_id = fs.put(b'stored bytes', filename='a.png')
+    chart_cache.remember_chart('a.png', str(chart_id), b'cached bytes')
+    fs.put(b'png b', filename='b.png')
+
+    bundle = read_bundle(stream_chart_bundle(fs, ['a.png', 'b.png']))
+    assert bundle.read('a.png') == b'cached bytes'
+    # b.png was streamed from GridFS and is hot now
+    assert chart_cache.cached_chart('b.png', chart_cache.chart_etag(fs.get_last_version('b.png'))) == b'png b'
+
+
+def test_empty_bundle_still_has_a_manifest(fs):
+    bundle = read_bundle(stream_chart_bundle(fs, ['missing.png']))
+    assert bundle.namelist() == ['manifest.json']
+    assert json.loads(bundle.read('manifest.json')) == {'charts': [], 'missing': ['missing.png']}
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from conftest import csv_upload, make_feedback_df
+
+
+def upload(client, df, filename='feedback.csv'):
+    response = client.post('/upload', data={'file': csv_upload(df, filename), 'feedbackType': 'stakeholder'})
+    assert response.status_code == 200
+    return response.get_json()['file_id']
+
+
+def test_chart_data_filenames_can_be_fetched(client):
+    file_id = upload(client, make_feedback_df())
+    response = client.post('/chart-data', data={'fileIds': json.dumps([file_id]), 'choice': '1', 'reportType': 'generalized'})
+    assert response.status_code == 200
+    charts = response.get_json()['charts']
+    assert charts
+
+    for chart in charts:
+        png = client.get(f"/charts/{chart['filename']}")
+        assert png.status_code == 200
+        assert png.mimetype == 'image/png'
+        assert png.data.startswith(b'\x89PNG')
+
+
+def test_chart_data_matches_generate_charts_names(client):
+    file_id = upload(client, make_feedback_df())
+    form = {'fileIds': json.dumps([file_id]), 'choice': '2', 'reportType': 'fieldwise', 'chartProfile': 'thumbnail'}
+    data = client.post('/chart-data', data=form).get_json()
+    generated = client.post('/generate-charts', data=form).get_json()
+    assert [chart['filename'] for chart in data['charts']] == [url.rsplit('/', 1)[1] for url in generated['chart_urls']]
+
+
+def test_chart_data_rejects_unknown_profile(client):
+    file_id = upload(client, make_feedback_df())
+    response = client.post('/chart-data', data={'fileIds': json.dumps([file_id]), 'chartProfile': 'poster'})
+    assert response.status_code == 400
+
+
+def test_lazy_chart_render_is_admission_controlled(client, monkeypatch):
+    import admission
+    file_id = upload(client, make_feedback_df())
+    filename = client.post('/chart-data', data={'fileIds': json.dumps([file_id])}).get_json()['charts'][0]['filename']
+
+    def busy(*args, **kwargs):
+        raise admission.AdmissionRejected('memory')
+
+    real_acquire = admission.controller.acquire
+    monkeypatch.setattr(admission.controller, 'acquire', busy)
+    assert client.get(f'/charts/{filename}').status_code == 429
+
+    monkeypatch.setattr(admission.controller, 'acquire', real_acquire)
+    assert client.get(f'/charts/{filename}').status_code == 200
+
+    # Once stored, the chart is served without a ticket
+    monkeypatch.setattr(admission.controller, 'acquire', busy)
+    assert client.get(f'/charts/{filename}').status_code == 200
+
+
+def test_hot_content_addressed_chart_skips_mongo(client, monkeypatch):
+    import database
+    file_id = upload(client, make_feedback_df())
+    filename = client.post('/chart-data', data={'fileIds': json.dumps([file_id])}).get_json()['charts'][0]['filename']
+    first = client.get(f'/charts/{filename}')
+    etag = first.headers['ETag']
+
+    # Any GridFS lookup now fails the request
+    monkeypatch.setitem(database._services, 'fs_charts', None)
+    again = client.get(f'/charts/{filename}')
+    assert again.status_code == 200
+    assert again.data == first.data
+    assert again.headers['ETag'] == etag
+
+    assert client.get(f'/charts/{filename}', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_clear_chart_cache_removes_pngs_specs_and_hot_charts(client, db):
+    file_id = upload(client, make_feedback_df())
+    filename = client.post('/chart-data', data={'fileIds': json.dumps([file_id])}).get_json()['charts'][0]['filename']
+    assert client.get(f'/charts/{filename}').status_code == 200
+
+    assert client.post('/clear-chart-cache').status_code == 200
+    for collection in ('charts', 'charts.files', 'charts.chunks', 'chart_specs'):
+        assert db[collection].count_documents({}) == 0
+    assert client.get(f'/charts/{filename}').status_code == 404
+
+
+@pytest.mark.parametrize('payload', [{'filenames': 'chart.png'}, {'filenames': [1, 2]}, {'filenames': ['a.png', None]}, ['a.png'], {}])
+def test_chart_bundle_rejects_malformed_filenames(client, payload):
+    assert client.post('/charts/bundle', json=payload).status_code == 400
+
+
+def test_chart_bundle_zips_the_named_charts(client):
+    import io
+    import zipfile
+    file_id = upload(client, make_feedback_df())
+    filenames = [chart['filename'] for chart in client.post('/chart-data', data={'fileIds': json.dumps([file_id])}).get_json()['charts']]
+    response = client.post('/charts/bundle', json={'filenames': filenames})
+    assert response.status_code == 200
+    assert sorted(zipfile.ZipFile(io.BytesIO(response.data)).namelist()) == sorted(filenames + ['manifest.json'])
@@ -0,0 +1,50 @@
+from io import BytesIO
+
+import pytest
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from chart_profiles import CHART_PROFILES, chart_figsize, figure_to_png, get_chart_profile
+
+
+@pytest.fixture
+def figure():
+    fig = Figure(figsize=(8, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.bar(range(5), [5, 3, 4, 1, 2], color=['#440154', '#3b528b', '#21918c', '#5ec962', '#fde725'])
+    ax.set_title('Curriculum')
+    return fig
+
+
+def png_image(data):
+    return Image.open(BytesIO(data))
+
+
+def test_unknown_profile_is_rejected_and_none_means_print():
+    assert get_chart_profile() is CHART_PROFILES['print']
+    with pytest.raises(ValueError, match='Unknown chart profile'):
+        get_chart_profile('poster')
+
+
+def test_figure_size_follows_categories_up_to_the_original_size():
+    assert chart_figsize('stakeholder', 2) < chart_figsize('stakeholder', 6)
+    assert chart_figsize('stakeholder', 100)[0] == 30
+    assert chart_figsize('subject', 100) == (40, 20)
+
+
+def test_print_is_flattened_full_resolution_rgb(figure):
+    image = png_image(figure_to_png(figure, 'print'))
+    assert image.mode == 'RGB'
+    assert image.size == (800, 400)
+
+
+def test_preview_is_quantized_at_half_resolution(figure):
+    printed = figure_to_png(figure, 'print')
+    preview = figure_to_png(figure, 'preview')
+    image = png_image(preview)
+    assert image.mode == 'P'
+    assert len(image.getcolors()) <= CHART_PROFILES['preview']['quantize']
+    assert image.size == (400, 200)
+    assert len(preview) < len(printed)
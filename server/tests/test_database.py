@@ -0,0 +1,87 @@
+import json
+import os
+
+import mongomock
+import pytest
+
+import database
+
+
+def evaluate(expr, doc, variables=None):
+    """Just enough of the aggregation expression language to run REVERSED_FILENAME_PIPELINE"""
+    variables = variables or {}
+    if isinstance(expr, str) and expr.startswith('$$'):
+        return variables[expr[2:]]
+    if isinstance(expr, str) and expr.startswith('$'):
+        return doc.get(expr[1:])
+    if not isinstance(expr, dict):
+        return expr
+    (op, args), = expr.items()
+    if op == '$reduce':
+        value = evaluate(args['initialValue'], doc, variables)
+        for item in evaluate(args['input'], doc, variables):
+            value = evaluate(args['in'], doc, {**variables, 'this': item, 'value': value})
+        return value
+    args = [evaluate(arg, doc, variables) for arg in (args if isinstance(args, list) else [args])]
+    if op == '$range':
+        return list(range(*args))
+    if op == '$strLenCP':
+        return len(args[0])
+    if op == '$ifNull':
+        return args[0] if args[0] is not None else args[1]
+    if op == '$concat':
+        return ''.join(args)
+    if op == '$substrCP':
+        return args[0][args[1]:args[1] + args[2]]
+    raise NotImplementedError(op)
+
+
+@pytest.mark.parametrize('filename', ['feedback.csv', 'Résumé – Q1.xlsx', 'a', '', None])
+def test_reversed_filename_pipeline_reverses_the_name(filename):
+    expr = database.REVERSED_FILENAME_PIPELINE[0]['$set']['reversed_filename']
+    assert evaluate(expr, {'filename': filename}) == (filename or '')[::-1]
+
+
+def test_backfill_is_one_update_many(monkeypatch):
+    db = mongomock.MongoClient()['feedback_db']
+    db['files.files'].insert_many([{'filename': 'old.csv'}, {'filename': 'new.csv', 'reversed_filename': 'vsc.wen'}])
+    calls = []
+    monkeypatch.setattr(mongomock.collection.Collection, 'update_one', lambda self, *a, **k: calls.append(('update_one', a)))
+    monkeypatch.setattr(mongomock.collection.Collection, 'update_many', lambda self, *a, **k: calls.append(('update_many', a)))
+    database.ensure_indexes(db)
+    assert calls == [('update_many', ({'reversed_filename': {'$exists': False}}, database.REVERSED_FILENAME_PIPELINE))]
+
+
+def test_pool_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '20')
+    monkeypatch.setenv('MONGO_COMPRESSORS', 'zstd,zlib')
+    monkeypatch.delenv('MONGO_MIN_POOL_SIZE', raising=False)
+    options = database.mongo_client_options()
+    assert options['maxPoolSize'] == 20
+    assert options['compressors'] == 'zstd,zlib'
+    assert 'minPoolSize' not in options
+    assert database.pool_stats()['settings'] == {'maxPoolSize': 20, 'compressors': 'zstd,zlib'}
+
+
+def test_pool_stats_never_connect(monkeypatch):
+    monkeypatch.setattr(database, '_services', {})
+    assert database.pool_stats()['connected'] is False
+    assert database._services == {}
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_drops_the_parents_client(db):
+    assert database._services
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, json.dumps({'services': list(database._services), 'failed_at': database._failed_at}).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        child = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+    assert child == {'services': [], 'failed_at': None}
+    # The parent keeps its own client
+    assert database._services
@@ -0,0 +1,80 @@
+import types
+
+import pytest
+
+import deadlines
+from deadlines import LatencyBudget
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A perf_counter the test moves by hand"""
+    now = [0.0]
+    monkeypatch.setattr(deadlines.time, 'perf_counter', lambda: now[0])
+    return now
+
+
+def test_steps_degrade_in_order_as_the_budget_is_used(clock):
+    budget = LatencyBudget(100)
+    assert [budget.should_degrade(step) for step in deadlines.DEGRADATION_STEPS] == [False, False, False]
+
+    clock[0] = 50
+    assert [budget.should_degrade(step) for step in deadlines.DEGRADATION_STEPS] == [True, False, False]
+    clock[0] = 70
+    assert [budget.should_degrade(step) for step in deadlines.DEGRADATION_STEPS] == [True, True, False]
+    clock[0] = 85
+    assert [budget.should_degrade(step) for step in deadlines.DEGRADATION_STEPS] == [True, True, True]
+
+
+def test_slow_progress_degrades_before_the_time_is_used(clock):
+    budget = LatencyBudget(100)
+    budget.note_progress(0, 10)
+    clock[0] = 20
+    budget.note_progress(1, 10)
+    # 20 s per group projects 200 s, twice the budget, after only a fifth of it
+    assert budget.projected() == pytest.approx(200)
+    assert budget.update_level() == 3
+
+
+def test_level_never_goes_back_down(clock):
+    budget = LatencyBudget(100)
+    budget.note_progress(0, 4)
+    clock[0] = 30
+    budget.note_progress(1, 4)
+    assert budget.update_level() == 1
+    # Later groups were fast: the projection drops below the budget, the level stays
+    clock[0] = 32
+    budget.note_progress(4, 4)
+    assert budget.update_level() == 1
+
+
+def test_degradations_are_recorded_once_per_step_with_counts(clock):
+    budget = LatencyBudget(10)
+    clock[0] = 9
+    budget.should_degrade('ai_summaries')
+    budget.should_degrade('ai_summaries')
+    budget.should_degrade('tables_only')
+    doc = budget.to_doc()
+    assert doc['level'] == 3
+    assert [entry['step'] for entry in doc['degraded']] == ['ai_summaries', 'tables_only']
+    assert doc['degraded'][0] == {'step': 'ai_summaries', 'count': 2, 'first_at_seconds': 9}
+
+
+def test_module_helpers_are_no_ops_outside_a_budgeted_request():
+    assert deadlines.should_degrade('ai_summaries') is False
+    assert deadlines.llm_time_limit() is None
+    assert deadlines.degradations_json() is None
+
+
+@pytest.mark.parametrize('form, headers, expected', [
+    ({}, {}, deadlines.REPORT_DEADLINE_SECONDS),
+    ({'deadlineSeconds': '30'}, {}, 30),
+    ({}, {'X-Deadline-Seconds': '12.5'}, 12.5),
+    ({'deadlineSeconds': '0'}, {}, 1.0),
+    ({'deadlineSeconds': '99999'}, {}, deadlines.REPORT_DEADLINE_SECONDS),
+    ({'deadlineSeconds': 'soon'}, {}, deadlines.REPORT_DEADLINE_SECONDS),
+    ({'deadlineSeconds': 'nan'}, {}, deadlines.REPORT_DEADLINE_SECONDS),
+])
+def test_requested_seconds_is_clamped(form, headers, expected):
+    request = types.SimpleNamespace(form=form, headers=headers)
+    assert deadlines.requested_seconds(request) == expected
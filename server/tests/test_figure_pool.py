@@ -0,0 +1,56 @@
+import threading
+
+from figure_pool import FigurePool
+
+
+def test_released_figures_are_cleared_and_reused():
+    pool = FigurePool(max_size=2)
+    fig = pool.acquire((6, 4))
+    fig.add_subplot().plot([1, 2, 3])
+    fig.subplots_adjust(bottom=0.4)
+    pool.release(fig)
+
+    again = pool.acquire((10, 5))
+    assert again is fig
+    assert again.axes == []
+    assert tuple(again.get_size_inches()) == (10, 5)
+    assert again.subplotpars.bottom != 0.4
+    assert (pool.created, pool.reused) == (1, 1)
+
+
+def test_concurrent_callers_get_different_figures():
+    pool = FigurePool()
+    first = pool.acquire((4, 4))
+    second = pool.acquire((4, 4))
+    assert first is not second
+    assert pool.created == 2
+
+
+def test_pool_keeps_at_most_max_size_idle_figures():
+    pool = FigurePool(max_size=1)
+    figures = [pool.acquire((4, 4)) for _ in range(3)]
+    for fig in figures:
+        pool.release(fig)
+    assert len(pool._idle) == 1
+    pool.clear()
+    assert pool._idle == []
+
+
+def test_threads_render_with_their_own_figures():
+    pool = FigurePool()
+    held = []
+    lock = threading.Lock()
+
+    def render():
+        fig = pool.acquire((4, 4))
+        fig.add_subplot().bar([0, 1], [2, 3])
+        fig.canvas.draw()
+        with lock:
+            held.append(fig)
+
+    threads = [threading.Thread(target=render) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(fig) for fig in held}) == 4
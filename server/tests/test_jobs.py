@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from jobs import CLIENT_CLOSED_REQUEST, CancellationToken, JobCancelled, cancellable_job, current_token, run_cancellable, running_job
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_outside_a_job_without_timeout_calls_directly():
+    assert run_cancellable(threading.current_thread) is threading.current_thread()
+
+
+def test_timed_out_calls_do_not_hold_up_the_next_one(release):
+    for _ in range(8):
+        with pytest.raises(TimeoutError):
+            run_cancellable(release.wait, timeout=0.05)
+    started = time.monotonic()
+    assert run_cancellable(lambda: 'ok', timeout=1) == 'ok'
+    assert time.monotonic() - started < 0.5
+
+
+def test_call_errors_reach_the_caller():
+    def fail():
+        raise ValueError('quota exceeded')
+
+    with pytest.raises(ValueError, match='quota exceeded'):
+        run_cancellable(fail, timeout=1)
+
+
+def test_cancelled_job_stops_waiting(db, release):
+    token = CancellationToken('job-wait', poll_seconds=0.05)
+    threading.Timer(0.1, token.cancel, args=('cancel_requested',)).start()
+    started = time.monotonic()
+    with pytest.raises(JobCancelled):
+        with running_job(token, 'test'):
+            run_cancellable(release.wait)
+    assert time.monotonic() - started < 1
+    assert db['jobs'].find_one({'_id': 'job-wait'})['status'] == 'cancelled'
+
+
+def test_cancelled_view_answers_499_with_its_job_id(db):
+    app = Flask(__name__)
+
+    @app.route('/work', methods=['POST'])
+    @cancellable_job
+    def work():
+        current_token().cancel('cancel_requested')
+        run_cancellable(time.sleep, 5)
+        return 'done'
+
+    response = app.test_client().post('/work', headers={'X-Job-ID': 'job-499'})
+    assert response.status_code == CLIENT_CLOSED_REQUEST
+    assert response.headers['X-Job-ID'] == 'job-499'
+    assert response.get_json()['reason'] == 'cancel_requested'
+
+
+def test_delete_cancels_a_running_job(client, db):
+    token = CancellationToken('job-delete')
+    with running_job(token, 'test'):
+        response = client.delete('/jobs/job-delete')
+        assert response.status_code == 202
+        assert token.cancelled
+    assert client.delete('/jobs/job-delete').status_code == 409
+    assert client.delete('/jobs/unknown-job').status_code == 404
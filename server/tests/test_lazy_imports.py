@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import SERVER_DIR
+
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'fpdf')
+
+
+def test_importing_the_app_defers_the_report_stack_and_mongo(tmp_path):
+    # A fresh interpreter: this test process has long imported all of them
+    script = (
+        "import json, sys\n"
+        f"sys.path.insert(0, {SERVER_DIR!r})\n"
+        "import app\n"
+        "import database\n"
+        f"print(json.dumps({{'loaded': [name for name in {HEAVY_MODULES!r} if name in sys.modules], 'services': list(database._services)}}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', script], cwd=tmp_path, env=dict(os.environ),
+        capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    imported = json.loads(result.stdout.strip().splitlines()[-1])
+    assert imported['loaded'] == []
+    # No MongoDB client until a request needs one
+    assert imported['services'] == []
@@ -0,0 +1,31 @@
+import pytest
+
+from jobs import JobCancelled
+from metrics import STAGE_ERRORS, STAGE_SECONDS, stage
+
+
+def stage_errors(name):
+    return STAGE_ERRORS.labels(name)._value.get()
+
+
+def stage_count(name):
+    return next(sample.value for sample in STAGE_SECONDS.collect()[0].samples
+                if sample.name.endswith('_count') and sample.labels['stage'] == name)
+
+
+def test_failing_stage_is_counted_as_an_error():
+    errors, runs = stage_errors('zip'), stage_count('zip')
+    with pytest.raises(ValueError):
+        with stage('zip'):
+            raise ValueError('bad archive')
+    assert stage_errors('zip') == errors + 1
+    assert stage_count('zip') == runs + 1
+
+
+def test_cancelled_stage_is_timed_but_not_an_error():
+    errors, runs = stage_errors('pdf_layout'), stage_count('pdf_layout')
+    with pytest.raises(JobCancelled):
+        with stage('pdf_layout'):
+            raise JobCancelled('client')
+    assert stage_errors('pdf_layout') == errors
+    assert stage_count('pdf_layout') == runs + 1
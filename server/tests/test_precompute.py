@@ -0,0 +1,28 @@
+import time
+
+import precompute
+from conftest import csv_upload, make_feedback_df
+
+
+def wait_for_job(client, job_id):
+    for _ in range(200):
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job.get('status') not in ('running', None):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_upload_precomputes_for_its_feedback_type(client, db, monkeypatch):
+    monkeypatch.setattr(precompute, 'PRECOMPUTE_AFTER_UPLOAD', True)
+    response = client.post('/upload', data={'file': csv_upload(make_feedback_df()), 'feedbackType': 'stakeholder'}).get_json()
+    job = wait_for_job(client, response['precompute_job_id'])
+    assert job['status'] == 'finished'
+    assert db['charts.files'].count_documents({}) > 0
+
+
+def test_upload_without_feedback_type_is_not_precomputed(client, db, monkeypatch):
+    monkeypatch.setattr(precompute, 'PRECOMPUTE_AFTER_UPLOAD', True)
+    response = client.post('/upload', data={'file': csv_upload(make_feedback_df())}).get_json()
+    assert 'precompute_job_id' not in response
+    assert db['chart_specs'].count_documents({}) == 0
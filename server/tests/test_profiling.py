@@ -0,0 +1,48 @@
+from urllib.parse import urlparse
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'secret')
+    return 'secret'
+
+
+def test_token_must_match_and_be_configured(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', None)
+    assert not profiling.is_authorized('anything')
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'secret')
+    assert not profiling.is_authorized(None)
+    assert not profiling.is_authorized('secre')
+    assert profiling.is_authorized('secret')
+
+
+def test_requests_without_the_token_are_not_profiled(client, token):
+    assert 'X-Profile-URL' not in client.get('/health').headers
+    assert 'X-Profile-URL' not in client.get('/health', headers={'X-Profile': 'wrong'}).headers
+
+
+def test_profiling_is_off_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', None)
+    assert 'X-Profile-URL' not in client.get('/health?__profile=').headers
+    assert 'X-Profile-URL' not in client.get('/health', headers={'X-Profile': 'None'}).headers
+
+
+@pytest.mark.parametrize('mode', profiling.PROFILE_MODES)
+def test_profiled_request_is_stored_and_readable_with_the_token(client, token, mode):
+    response = client.get('/health', headers={'X-Profile': token, 'X-Profile-Mode': mode})
+    assert response.status_code == 200
+    profile_path = urlparse(response.headers['X-Profile-URL']).path
+
+    assert client.get(profile_path).status_code == 403
+    assert client.get(profile_path, headers={'X-Profile': 'wrong'}).status_code == 403
+    summary = client.get(profile_path, headers={'X-Profile': token})
+    assert summary.status_code == 200
+    assert client.get(f'{profile_path}?kind=memory', headers={'X-Profile': token}).status_code == 200
+
+
+def test_invalid_mode_is_rejected(client, token):
+    assert client.get('/health', headers={'X-Profile': token, 'X-Profile-Mode': 'perf'}).status_code == 400
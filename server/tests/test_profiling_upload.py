@@ -0,0 +1,60 @@
+import io
+
+import pandas as pd
+
+from conftest import make_feedback_df
+from feedback_processor import profile_dataframe, profile_feedback_file
+from theme_index import build_theme_index
+
+
+def csv_stream(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+def test_profile_matches_full_parse_and_indexes_suggestions():
+    df = make_feedback_df(rows=300)
+    profile, theme_index = profile_feedback_file(csv_stream(df), sample_rows=50, chunk_rows=64)
+    assert profile == profile_dataframe(pd.read_csv(csv_stream(df)))
+    assert theme_index == build_theme_index(df['Any suggestions?'].tolist())
+
+
+def test_columns_are_read_in_chunks(monkeypatch):
+    df = make_feedback_df(rows=300)
+    read = []
+    real_read_csv = pd.read_csv
+
+    def recording_read_csv(*args, **kwargs):
+        read.append(kwargs.get('chunksize') or kwargs.get('nrows'))
+        return real_read_csv(*args, **kwargs)
+
+    monkeypatch.setattr(pd, 'read_csv', recording_read_csv)
+    profile_feedback_file(csv_stream(df), sample_rows=50, chunk_rows=64)
+    # The sample, then the profiled columns 64 rows at a time; never the whole file at once
+    assert read == [50, 64]
+
+
+def test_excel_uploads_are_profiled_too():
+    df = make_feedback_df(rows=60)
+    workbook = io.BytesIO()
+    df.to_excel(workbook, index=False)
+    workbook.seek(0)
+    profile, theme_index = profile_feedback_file(workbook, sample_rows=20)
+    assert profile == profile_dataframe(df)
+    assert theme_index['responses'] == 60
+
+
+def test_sampled_likert_guess_is_checked_against_every_row():
+    df = make_feedback_df(rows=100)
+    # Looks like a 1-5 rating in the sample, but is a free number overall
+    df['Curriculum [Hours per week]'] = [3] * 20 + list(range(10, 90))
+    profile, _ = profile_feedback_file(csv_stream(df), sample_rows=20, chunk_rows=30)
+    assert 'Curriculum [Hours per week]' not in profile['likert_columns']
+    assert all('Curriculum [Hours per week]' not in cols for _, cols in profile['category_groups'])
+
+
+def test_sheet_without_rating_columns_still_counts_rows():
+    df = pd.DataFrame({'Name': [f'n{i}' for i in range(25)], 'Email': ['x@y.z'] * 25})
+    profile, theme_index = profile_feedback_file(csv_stream(df), sample_rows=5, chunk_rows=10)
+    assert profile['row_count'] == 25
+    assert profile['likert_columns'] == []
+    assert theme_index is None
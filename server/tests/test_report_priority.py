@@ -0,0 +1,33 @@
+import io
+import json
+
+from app import app, report_priority
+
+
+def classify(data):
+    with app.test_request_context('/generate-report', method='POST', data=data, content_type='multipart/form-data'):
+        return report_priority()
+
+
+def csv_file(name):
+    return io.BytesIO(b'Name,Q1\nA,3\n'), name
+
+
+def test_single_posted_file_is_standard():
+    assert classify({'choice': '1', 'files[]': [csv_file('a.csv')]}) == 'standard'
+    assert classify({'choice': '1', 'file': [csv_file('a.csv')]}) == 'standard'
+
+
+def test_multiple_posted_files_are_bulk_under_every_field_name():
+    for field in ['files[]', 'files', 'file']:
+        assert classify({'choice': '1', field: [csv_file('a.csv'), csv_file('b.csv')]}) == 'bulk'
+
+
+def test_per_group_report_is_bulk():
+    assert classify({'choice': '2', 'files[]': [csv_file('a.csv')]}) == 'bulk'
+
+
+def test_stored_file_ids_are_counted():
+    assert classify({'choice': '1', 'fileIds': json.dumps(['1' * 24])}) == 'standard'
+    assert classify({'choice': '1', 'fileIds': json.dumps(['1' * 24, '2' * 24])}) == 'bulk'
+    assert classify({'choice': '1', 'storedFilenames': json.dumps(['a.csv', 'b.csv'])}) == 'bulk'
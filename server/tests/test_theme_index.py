@@ -0,0 +1,79 @@
+from theme_index import build_theme_index, merge_theme_indexes
+
+
+def entries(index, order):
+    return {phrase: (count, rows) for phrase, count, rows in index['ngrams'][str(order)]}
+
+
+def test_build_counts_mentions_and_responding_rows():
+    index = build_theme_index([
+        'More practical lab sessions, more lab time',
+        None,
+        float('nan'),
+        '   ',
+        'Practical lab sessions please',
+    ])
+    assert index['responses'] == 2
+    assert entries(index, 1)['lab'] == (3, 2)
+    assert entries(index, 3)['practical lab sessions'] == (2, 2)
+    assert dict(index['postings'])['practical lab sessions'] == [0, 4]
+
+
+def test_phrases_never_start_or_end_on_stopwords_or_numbers():
+    index = build_theme_index(['the wifi in the hostel is slow', 'wifi 24 hours'])
+    phrases = [phrase for order in ('1', '2', '3') for phrase, _, _ in index['ngrams'][order]]
+    assert 'wifi' in phrases
+    assert not any(phrase.split()[0] in ('the', 'in', 'is', '24') or phrase.split()[-1] in ('the', 'in', 'is', '24') for phrase in phrases)
+
+
+def test_build_caps_terms_and_postings():
+    index = build_theme_index([f'canteen food item{i}' for i in range(30)], max_terms=5, max_postings=3)
+    assert all(len(index['ngrams'][order]) <= 5 for order in ('1', '2', '3'))
+    assert dict(index['postings'])['canteen food'] == [0, 1, 2]
+
+
+def test_merge_ranks_by_files_then_responses_and_drops_covered_subphrases():
+    first = build_theme_index(['better library books'] * 3 + ['canteen food'] * 5)
+    second = build_theme_index(['better library books'] * 2 + ['hostel wifi'] * 2)
+    themes = merge_theme_indexes([first, second], top=10)
+    phrases = [theme['phrase'] for theme in themes]
+
+    # In both files beats more responses in one
+    assert phrases[0] == 'better library books'
+    assert themes[0]['files'] == 2 and themes[0]['responses'] == 5
+    assert phrases.index('canteen food') < phrases.index('hostel wifi')
+    # Always inside the longer phrase, so not listed separately
+    assert 'library books' not in phrases and 'library' not in phrases
+
+
+def test_merge_applies_min_responses_and_top():
+    index = build_theme_index(['exam schedule'] * 2 + ['sports day'])
+    assert [theme['phrase'] for theme in merge_theme_indexes([index], min_responses=2)] == ['exam schedule']
+    assert len(merge_theme_indexes([index], top=1, min_responses=1)) == 1
+
+
+def test_suggestions_reuse_stored_sketches_for_stored_uploads(client, monkeypatch):
+    import json
+
+    import app as app_module
+    from conftest import csv_upload, make_feedback_df
+
+    file_ids = [
+        client.post('/upload', data={'file': csv_upload(make_feedback_df(seed=seed), f'dept{seed}.csv')}).get_json()['file_id']
+        for seed in (1, 2)
+    ]
+    rebuilt = []
+    real_build = app_module.build_theme_index
+    monkeypatch.setattr(app_module, 'build_theme_index', lambda texts: rebuilt.append(texts) or real_build(texts))
+
+    response = client.post('/get-suggestions', data={'fileIds': json.dumps(file_ids), 'feedbackType': 'stakeholder'})
+    assert response.status_code == 200
+    assert rebuilt == []
+
+    # Posted files have no stored sketch and are still indexed on the fly
+    response = client.post('/get-suggestions', data={
+        'feedbackType': 'stakeholder',
+        'files[]': [csv_upload(make_feedback_df(seed=3), 'posted.csv')],
+    })
+    assert response.status_code == 200
+    assert len(rebuilt) == 1
@@ -0,0 +1,49 @@
+import json
+
+import profiling
+import tracing
+
+
+def test_lines_from_end_reads_backwards_across_blocks(tmp_path):
+    path = tmp_path / 'lines.txt'
+    lines = [f"line {i} " + 'x' * (i * 7 % 50) for i in range(200)]
+    path.write_text('\n'.join(lines) + '\n')
+    assert [line.decode() for line in tracing._lines_from_end(str(path), block_size=64)] == lines[::-1]
+
+
+def test_write_trace_rotates_and_keeps_every_line(tmp_path, monkeypatch):
+    trace_file = str(tmp_path / 'traces.jsonl')
+    monkeypatch.setattr(tracing, 'TRACE_FILE', trace_file)
+    monkeypatch.setattr(tracing, 'TRACE_MAX_BYTES', 200)
+    for i in range(20):
+        tracing.write_trace({'request_id': f'r{i}', 'name': 'GET /x'})
+
+    ids = [doc['request_id'] for doc in tracing._read_traces()]
+    assert ids[0] == 'r19'
+    assert ids == sorted(ids, key=lambda rid: -int(rid[1:]))
+    with open(trace_file + '.1') as rotated:
+        assert all(json.loads(line) for line in rotated)
+    assert tracing.find_trace('r19')['name'] == 'GET /x'
+
+
+def test_traces_need_the_admin_token(client, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'secret')
+    client.get('/health')
+    assert client.get('/traces').status_code == 403
+    assert client.get('/traces', headers={'X-Profile': 'wrong'}).status_code == 403
+    assert client.get('/traces/abc?__profile=wrong').status_code == 403
+
+    response = client.get('/traces?limit=x', headers={'X-Profile': 'secret'})
+    assert response.status_code == 200
+    assert isinstance(response.get_json()['traces'], list)
+    assert client.get('/traces?limit=-5&__profile=secret').status_code == 200
+
+
+def test_traces_limit_is_clamped(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', 'secret')
+    monkeypatch.setattr(tracing, 'TRACE_FILE', str(tmp_path / 'traces.jsonl'))
+    monkeypatch.setattr(tracing, 'TRACE_LIST_MAX', 3)
+    for i in range(5):
+        tracing.write_trace({'request_id': f'r{i}', 'name': 'GET /x'})
+    traces = client.get('/traces?limit=100', headers={'X-Profile': 'secret'}).get_json()['traces']
+    assert [doc['request_id'] for doc in traces] == ['r4', 'r3', 'r2']
@@ -0,0 +1,32 @@
+import pytest
+
+import app as app_module
+from conftest import csv_upload, make_feedback_df
+
+
+@pytest.mark.parametrize('file_ids', ['[not json', '"abc"', '{"id": 1}', '[1, 2]'])
+@pytest.mark.parametrize('endpoint', ['/chart-data', '/generate-charts', '/generate-report', '/get-suggestions'])
+def test_malformed_file_ids_answer_400(client, endpoint, file_ids):
+    response = client.post(endpoint, data={'fileIds': file_ids, 'choice': '1', 'feedbackType': 'stakeholder'})
+    assert response.status_code == 400
+    assert 'fileIds' in response.get_json()['error']
+
+
+def test_unknown_file_id_answers_404(client):
+    response = client.post('/chart-data', data={'fileIds': '["0123456789abcdef01234567"]'})
+    assert response.status_code == 404
+
+
+def test_refs_are_resolved_once_per_request(client, monkeypatch):
+    file_id = client.post('/upload', data={'file': csv_upload(make_feedback_df())}).get_json()['file_id']
+    calls = []
+    real_find_upload = app_module.find_upload
+
+    def counting_find_upload(**kwargs):
+        calls.append(kwargs)
+        return real_find_upload(**kwargs)
+
+    monkeypatch.setattr(app_module, 'find_upload', counting_find_upload)
+    response = client.post('/chart-data', data={'fileIds': f'["{file_id}"]'})
+    assert response.status_code == 200
+    assert calls == [{'file_id': file_id}]
@@ -0,0 +1,72 @@
+import hashlib
+import io
+
+import gridfs
+import mongomock
+import pytest
+
+from uploads import UploadTooLarge, hash_stream, stream_to_gridfs
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['uploads_test']
+
+
+@pytest.fixture
+def fs(db):
+    return gridfs.GridFS(db, collection='files')
+
+
+def stored_documents(db):
+    return db['files.files'].count_documents({}) + db['files.chunks'].count_documents({})
+
+
+class FailingStream(io.BytesIO):
+    """Fails once a few GridFS chunks have been written, like a client that drops mid-upload"""
+
+    def read(self, size=-1):
+        if self.tell() > 600 * 1024:
+            raise OSError('connection reset')
+        return super().read(size)
+
+
+def test_stores_content_with_size_hash_and_csv_header(fs):
+    content = b'Name,Branch,Curriculum [Teaching]\nA,CS,5\nB,IT,4\n' * 1000
+    stored = stream_to_gridfs(fs, io.BytesIO(content), 'feedback.csv', 'text/csv', chunk_size=1024)
+    assert stored['size'] == len(content)
+    assert stored['sha256'] == hashlib.sha256(content).hexdigest()
+    assert stored['format'] == 'csv'
+    assert stored['headers'] == ['Name', 'Branch', 'Curriculum [Teaching]']
+    grid_out = fs.get(stored['file_id'])
+    assert grid_out.read() == content
+    assert grid_out.reversed_filename == 'vsc.kcabdeef'
+
+
+def test_excel_files_are_recognised_without_headers(fs):
+    stored = stream_to_gridfs(fs, io.BytesIO(b'PK\x03\x04' + b'\0' * 100), 'feedback.xlsx')
+    assert (stored['format'], stored['headers']) == ('xlsx', None)
+
+
+def test_oversized_upload_is_rejected_and_removed(db, fs):
+    with pytest.raises(UploadTooLarge):
+        stream_to_gridfs(fs, io.BytesIO(b'x' * 1024 * 1024), 'big.csv', max_bytes=700 * 1024, chunk_size=64 * 1024)
+    assert stored_documents(db) == 0
+
+
+def test_upload_at_the_limit_is_accepted(fs):
+    stored = stream_to_gridfs(fs, io.BytesIO(b'x' * 4096), 'exact.csv', max_bytes=4096, chunk_size=1024)
+    assert stored['size'] == 4096
+
+
+def test_broken_stream_leaves_no_partial_file(db, fs):
+    with pytest.raises(OSError):
+        stream_to_gridfs(fs, FailingStream(b'a,b\n1,2\n' * 128 * 1024), 'broken.csv', chunk_size=64 * 1024)
+    assert stored_documents(db) == 0
+
+
+def test_hash_stream_rewinds():
+    stream = io.BytesIO(b'feedback')
+    stream.read(3)
+    assert hash_stream(stream, chunk_size=2) == hashlib.sha256(b'feedback').hexdigest()
+    assert stream.tell() == 0
@@ -0,0 +1,54 @@
+import zipfile
+
+import pandas as pd
+from fpdf import FPDF
+
+from conftest import make_feedback_df
+from feedback_processor import process_feedback
+from vector_charts import draw_rating_chart, wrap_label
+
+
+def narrow_pdf():
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Arial', '', 7)
+    return pdf
+
+
+def test_wrap_label_fits_each_line_to_the_width():
+    pdf = narrow_pdf()
+    lines = wrap_label(pdf, 'Quality of the laboratory equipment', 20)
+    assert len(lines) > 1
+    assert ' '.join(lines) == 'Quality of the laboratory equipment'
+    assert all(pdf.get_string_width(line) <= 20 for line in lines)
+
+
+def test_wrap_label_breaks_long_words_and_truncates():
+    pdf = narrow_pdf()
+    assert all(pdf.get_string_width(line) <= 6 for line in wrap_label(pdf, 'Infrastructure', 6, max_lines=10))
+    lines = wrap_label(pdf, 'one two three four five six seven eight', 8, max_lines=2)
+    assert len(lines) == 2 and lines[-1].endswith('...')
+
+
+def test_chart_labels_are_drawn_under_their_groups():
+    labels = ['Teaching quality of the faculty'] + [f'Area {i}' for i in range(7)]
+    score_df = pd.DataFrame({'Category': labels, **{rating: [rating] * len(labels) for rating in [5, 4, 3, 2, 1]}})
+    pdf = FPDF()
+    pdf.set_compression(False)
+    draw_rating_chart(pdf, score_df, 'Curriculum', 'All Students')
+    content = pdf.output(dest='S').encode('latin-1')
+    assert all(f'({label}) Tj'.encode() in content for label in labels[1:])
+    # Too wide for its group, so wrapped over several lines
+    assert b'(Teaching quality of the faculty) Tj' not in content
+    assert b'faculty) Tj' in content
+    # No numbered key below the chart any more
+    assert b'(1. ' not in content
+
+
+def test_vector_report_pdf_has_no_embedded_images():
+    zip_buffer = process_feedback(make_feedback_df(), 'feedback.csv', '1', chart_style='vector')
+    with zipfile.ZipFile(zip_buffer) as zf:
+        [name] = zf.namelist()
+        pdf_bytes = zf.read(name)
+    assert pdf_bytes.startswith(b'%PDF')
+    assert b'/Subtype /Image' not in pdf_bytes
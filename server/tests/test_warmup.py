@@ -0,0 +1,26 @@
+from prometheus_client import REGISTRY
+
+import tracing
+import warmup
+from metrics import stage
+
+
+def stage_count(name):
+    return REGISTRY.get_sample_value('feedback_stage_seconds_count', {'stage': name}) or 0
+
+
+def test_warm_up_records_no_stage_metrics_or_spans(monkeypatch):
+    monkeypatch.setattr(warmup, 'WARMUP_ENABLED', True)
+    before = {name: stage_count(name) for name in ('chart_render', 'pdf_output')}
+    trace = tracing.start_trace(name='warm-up test')
+    try:
+        warmup.warm_up_rendering()
+    finally:
+        tracing.finish_trace()
+    assert {name: stage_count(name) for name in before} == before
+    assert trace.to_doc()['spans'] == []
+
+    # Stages outside the warm-up are still recorded
+    with stage('chart_render'):
+        pass
+    assert stage_count('chart_render') == before['chart_render'] + 1
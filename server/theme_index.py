@@ -0,0 +1,142 @@
+"""
+Keyword and n-gram index over suggestion text.
+
+Each upload gets a small frequency sketch of normalized unigrams, bigrams and
+trigrams from its suggestion column, plus an inverted index from every kept
+n-gram to the rows that mention it. The sketch is built in a single pass over
+the column and stored in the `themes` collection, so cross-stakeholder themes
+can be found by merging sketches instead of asking Gemini.
+"""
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Words that never make a useful theme on their own or at the edge of a phrase
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been
+before being below between both but by can could did do does doing done down
+during each etc even every few for from further get got had has have having he
+her here hers him his how i if in into is it its itself just like may me might
+more most much must my nan na nil no none nor not nothing now of off ok okay on
+once only or other our ours out over own please quite rather really same shall
+she should so some such than thank thanks that the their theirs them then there
+these they this those through to too under until up upon us very was we well
+were what when where which while who whom why will with within would yes yet
+you your yours
+""".split())
+
+MAX_NGRAM = 3
+MAX_TERMS_PER_ORDER = 500  # n-grams kept per order in a stored sketch
+MAX_POSTINGS = 50  # row numbers kept per n-gram in the inverted index
+
+
+def normalize_tokens(text):
+    """Lower-case a suggestion and split it into alphanumeric tokens."""
+    if text is None:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _is_edge_word(token):
+    return token in STOPWORDS or token.isdigit() or len(token) < 2
+
+
+def iter_ngrams(tokens, max_n=MAX_NGRAM):
+    """Yield (n, phrase) for every n-gram that does not start or end on a stopword."""
+    for n in range(1, max_n + 1):
+        for i in range(len(tokens) - n + 1):
+            gram = tokens[i:i + n]
+            if _is_edge_word(gram[0]) or _is_edge_word(gram[-1]):
+                continue
+            if n == 1 and len(gram[0]) < 3:
+                continue
+            yield n, " ".join(gram)
+
+
+def build_theme_index(suggestions, max_terms=MAX_TERMS_PER_ORDER, max_postings=MAX_POSTINGS):
+    """
+    Build the n-gram sketch for an iterable of suggestion texts in one pass.
+
+    Returns a dict with the number of non-empty responses, and per order a list
+    of [phrase, count, responses] entries (count = total mentions, responses =
+    number of rows mentioning the phrase), plus postings for the kept phrases.
+    """
+    term_counts = defaultdict(Counter)
+    row_counts = defaultdict(Counter)
+    postings = defaultdict(list)
+    responses = 0
+
+    for row, text in enumerate(suggestions):
+        if text is None or text != text:  # skip None and NaN
+            continue
+        tokens = normalize_tokens(text)
+        if not tokens:
+            continue
+        responses += 1
+        seen = set()
+        for n, phrase in iter_ngrams(tokens):
+            term_counts[n][phrase] += 1
+            if phrase not in seen:
+                seen.add(phrase)
+                row_counts[n][phrase] += 1
+                if len(postings[phrase]) < max_postings:
+                    postings[phrase].append(row)
+
+    ngrams = {}
+    kept = set()
+    for n in range(1, MAX_NGRAM + 1):
+        top = row_counts[n].most_common(max_terms)
+        ngrams[str(n)] = [[phrase, term_counts[n][phrase], rows] for phrase, rows in top]
+        kept.update(phrase for phrase, _ in top)
+
+    return {
+        "responses": responses,
+        "ngrams": ngrams,
+        "postings": [[phrase, postings[phrase]] for phrase in kept],
+    }
+
+
+def merge_theme_indexes(indexes, top=25, min_responses=2):
+    """
+    Merge several stored sketches into a ranked list of themes.
+
+    Phrases found in more files rank first, then by how many responses mention
+    them, then by longer phrases. Shorter phrases that mostly appear inside an
+    already selected longer phrase are dropped to keep the list readable.
+    """
+    merged = {}
+    for index in indexes:
+        for order, entries in (index.get("ngrams") or {}).items():
+            for phrase, count, rows in entries:
+                theme = merged.setdefault(phrase, {"phrase": phrase, "n": int(order), "count": 0, "responses": 0, "files": 0})
+                theme["count"] += count
+                theme["responses"] += rows
+                theme["files"] += 1
+
+    ranked = sorted(
+        (t for t in merged.values() if t["responses"] >= min_responses),
+        key=lambda t: (-t["files"], -t["responses"], -t["n"], t["phrase"])
+    )
+
+    themes = []
+    for theme in ranked:
+        padded = f" {theme['phrase']} "
+        if any(
+            chosen["n"] > theme["n"] and padded in f" {chosen['phrase']} " and chosen["responses"] >= 0.8 * theme["responses"]
+            for chosen in themes
+        ):
+            continue
+        themes.append(theme)
+        if len(themes) >= top:
+            break
+    return themes
+
+
+def format_themes_for_prompt(themes, limit=15):
+    """Render merged themes as short bullet lines for an LLM prompt."""
+    lines = []
+    for theme in themes[:limit]:
+        files = f" across {theme['files']} files" if theme["files"] > 1 else ""
+        lines.append(f"- {theme['phrase']} ({theme['responses']} responses{files})")
+    return "\n".join(lines)
@@ -0,0 +1,329 @@
+"""
+Lightweight in-process request tracing.
+
+Every request gets a request id (taken from X-Request-ID or generated) and a
+trace of nested, timed spans: process_feedback, each report group, every
+chart, GridFS operations, Gemini calls and the other pipeline stages (each
+metrics.stage() is also a span). When the request ends, its trace is
+appended as one JSON line to TRACE_FILE, shared by all workers. There is no
+external collector; GET /traces/<request_id> renders a waterfall from that
+file, read from its end. Both trace endpoints need the PROFILE_TOKEN admin
+token, like /profiles.
+
+Spans opened outside a traced request (scripts, warm-up) cost almost
+nothing and are dropped.
+"""
+import fcntl
+import functools
+import html
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TRACE_FILE = os.environ.get('TRACE_FILE', os.path.join('feedback_catalyst', 'traces.jsonl'))
+# Rotated to TRACE_FILE.1 past this size
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_MB', 20)) * 1024 * 1024
+TRACING_ENABLED = os.environ.get('TRACING', '1') == '1'
+# Endpoints not worth tracing
+UNTRACED_ENDPOINTS = {'health_check', 'metrics', 'get_trace', 'list_traces', 'static'}
+# Traces listed by GET /traces by default and at most
+TRACE_LIST_DEFAULT = 50
+TRACE_LIST_MAX = 500
+# Bytes read per step when scanning the trace file from its end
+TRACE_READ_BLOCK = 64 * 1024
+# Spans kept per trace, so a runaway loop cannot blow up one JSON line
+MAX_SPANS = 5000
+WATERFALL_WIDTH = 60
+# Client-supplied request ids are kept only if they look like ids
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_local = threading.local()
+
+
+class Trace:
+    def __init__(self, request_id, name, attrs=None):
+        self.request_id = request_id
+        self.name = name
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self._stack = []
+        self.dropped = 0
+        self.status = None
+
+    def open_span(self, name, attrs):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = {
+            'name': name,
+            'start_ms': (time.perf_counter() - self._t0) * 1000,
+            'duration_ms': None,
+            'depth': len(self._stack),
+            'parent': self._stack[-1] if self._stack else None,
+        }
+        if attrs:
+            span['attrs'] = {key: _plain(value) for key, value in attrs.items()}
+        self.spans.append(span)
+        self._stack.append(len(self.spans) - 1)
+        return span
+
+    def close_span(self, span, error=None):
+        span['duration_ms'] = round((time.perf_counter() - self._t0) * 1000 - span['start_ms'], 3)
+        span['start_ms'] = round(span['start_ms'], 3)
+        if error is not None:
+            span['error'] = f"{type(error).__name__}: {error}"
+        if self._stack and self.spans[self._stack[-1]] is span:
+            self._stack.pop()
+
+    def to_doc(self, status=None):
+        return {
+            'request_id': self.request_id,
+            'name': self.name,
+            'attrs': {key: _plain(value) for key, value in self.attrs.items()},
+            'status': status,
+            'started_at': self.started_at,
+            'duration_ms': round((time.perf_counter() - self._t0) * 1000, 3),
+            'pid': os.getpid(),
+            'dropped_spans': self.dropped,
+            'spans': self.spans,
+        }
+
+
+def _plain(value):
+    return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def current_request_id():
+    trace = current_trace()
+    return trace.request_id if trace else None
+
+
+def start_trace(request_id=None, name='', **attrs):
+    if not request_id or not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    _local.trace = Trace(request_id, name, attrs)
+    return _local.trace
+
+
+def finish_trace(status=None):
+    """End the current trace and append it to the trace file"""
+    trace = current_trace()
+    _local.trace = None
+    if trace is None:
+        return None
+    doc = trace.to_doc(status)
+    try:
+        write_trace(doc)
+    except OSError as e:
+        print(f"⚠️ Could not write trace {trace.request_id}: {e}")
+    return doc
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a child of the innermost open span of this thread's trace"""
+    trace = current_trace()
+    opened = trace.open_span(name, attrs) if trace is not None else None
+    if opened is None:
+        yield
+        return
+    try:
+        yield
+    except BaseException as e:
+        trace.close_span(opened, e)
+        raise
+    trace.close_span(opened)
+
+
+def traced(name, attrs=None):
+    """Decorator form of span(); attrs(*args, **kwargs) may compute span attributes from the call"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_trace() is None:
+                return func(*args, **kwargs)
+            with span(name, **(attrs(*args, **kwargs) if attrs else {})):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _is_current(f):
+    """Whether an open handle still refers to TRACE_FILE (another worker may have rotated it)"""
+    try:
+        return os.fstat(f.fileno()).st_ino == os.stat(TRACE_FILE).st_ino
+    except FileNotFoundError:
+        return False
+
+
+def write_trace(doc):
+    line = json.dumps(doc, default=str) + '\n'
+    os.makedirs(os.path.dirname(os.path.abspath(TRACE_FILE)), exist_ok=True)
+    while True:
+        with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            # Workers share the file: one whole line per lock, rotation under the same lock.
+            # After a rotation (ours or another worker's) reopen and lock the new file.
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if not _is_current(f):
+                    continue
+                if f.tell() > TRACE_MAX_BYTES:
+                    os.replace(TRACE_FILE, TRACE_FILE + '.1')
+                    continue
+                f.write(line)
+                f.flush()
+                return
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _lines_from_end(path, block_size=TRACE_READ_BLOCK):
+    """Lines of a file from last to first, read backwards in blocks instead of loading the whole file"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b''
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + tail).split(b'\n')
+            # The first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if tail:
+            yield tail
+
+
+def _read_traces():
+    """Trace documents from newest to oldest, current file first, then the rotated one"""
+    for path in (TRACE_FILE, TRACE_FILE + '.1'):
+        if not os.path.exists(path):
+            continue
+        for line in _lines_from_end(path):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def find_trace(request_id):
+    return next((doc for doc in _read_traces() if doc.get('request_id') == request_id), None)
+
+
+def recent_traces(limit=TRACE_LIST_DEFAULT):
+    traces = []
+    for doc in _read_traces():
+        traces.append({key: doc.get(key) for key in ('request_id', 'name', 'status', 'started_at', 'duration_ms', 'pid')})
+        if len(traces) >= limit:
+            break
+    return traces
+
+
+def _span_label(span):
+    attrs = ' '.join(f"{key}={value}" for key, value in (span.get('attrs') or {}).items())
+    label = '  ' * span['depth'] + span['name'] + (f" [{attrs}]" if attrs else '')
+    return label + (f" !! {span['error']}" if span.get('error') else '')
+
+
+def render_waterfall(doc, width=WATERFALL_WIDTH):
+    """Plain-text waterfall: one row per span, bar placed and sized by its share of the request"""
+    total = max(doc['duration_ms'], 0.001)
+    rows = [
+        f"{doc['name']}  request_id={doc['request_id']}  status={doc.get('status')}  "
+        f"total={doc['duration_ms']:.1f} ms  pid={doc.get('pid')}",
+        f"{'start ms':>10} {'dur ms':>10}  {'':{width}}  span",
+    ]
+    for span in doc['spans']:
+        duration = span['duration_ms'] if span['duration_ms'] is not None else total - span['start_ms']
+        offset = int(span['start_ms'] / total * width)
+        length = max(1, int(round(duration / total * width)))
+        bar = (' ' * offset + '█' * length)[:width]
+        rows.append(f"{span['start_ms']:>10.1f} {duration:>10.1f}  {bar:<{width}}  {_span_label(span)}")
+    if doc.get('dropped_spans'):
+        rows.append(f"... {doc['dropped_spans']} more spans not recorded")
+    return '\n'.join(rows) + '\n'
+
+
+def render_waterfall_html(doc):
+    total = max(doc['duration_ms'], 0.001)
+    rows = []
+    for span in doc['spans']:
+        duration = span['duration_ms'] if span['duration_ms'] is not None else total - span['start_ms']
+        left = span['start_ms'] / total * 100
+        bar_width = max(duration / total * 100, 0.2)
+        colour = '#d9534f' if span.get('error') else '#4a90d9'
+        rows.append(
+            f"<tr><td style='white-space:pre'>{html.escape(_span_label(span))}</td>"
+            f"<td style='text-align:right'>{span['start_ms']:.1f}</td><td style='text-align:right'>{duration:.1f}</td>"
+            f"<td style='width:60%'><div style='margin-left:{left:.2f}%;width:{bar_width:.2f}%;"
+            f"background:{colour};height:12px'></div></td></tr>"
+        )
+    return (
+        f"<html><head><title>Trace {html.escape(doc['request_id'])}</title></head>"
+        f"<body style='font-family:monospace'><h3>{html.escape(doc['name'])} &middot; {doc['duration_ms']:.1f} ms"
+        f" &middot; status {html.escape(str(doc.get('status')))}</h3>"
+        f"<table style='width:100%;border-collapse:collapse'><tr><th>span</th><th>start ms</th><th>dur ms</th><th></th></tr>"
+        + ''.join(rows) + "</table></body></html>"
+    )
+
+
+def init_app(app):
+    """Trace every request, return its id in X-Request-ID and serve /traces and /traces/<request_id>"""
+    from flask import Response, jsonify, request
+
+    @app.before_request
+    def _start_request_trace():
+        if TRACING_ENABLED and request.endpoint not in UNTRACED_ENDPOINTS:
+            start_trace(request.headers.get('X-Request-ID'), f"{request.method} {request.path}", endpoint=request.endpoint)
+
+    @app.after_request
+    def _tag_request_id(response):
+        request_id = current_request_id()
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+            current_trace().status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_trace(error=None):
+        trace = current_trace()
+        if trace is not None:
+            finish_trace(trace.status or (500 if error else None))
+
+    def authorized():
+        # Traces name files and request details: same admin token as /profiles
+        from profiling import is_authorized
+        return is_authorized(request.headers.get('X-Profile') or request.args.get('__profile'))
+
+    @app.route('/traces', methods=['GET'])
+    def list_traces():
+        if not authorized():
+            return jsonify({"error": "Not authorized"}), 403
+        limit = request.args.get('limit', TRACE_LIST_DEFAULT, type=int)
+        return jsonify({"traces": recent_traces(min(max(limit, 1), TRACE_LIST_MAX))})
+
+    @app.route('/traces/<request_id>', methods=['GET'])
+    def get_trace(request_id):
+        if not authorized():
+            return jsonify({"error": "Not authorized"}), 403
+        doc = find_trace(request_id)
+        if doc is None:
+            return jsonify({"error": "Trace not found"}), 404
+        output = request.args.get('format', 'text')
+        if output == 'json':
+            return jsonify(doc)
+        if output == 'html':
+            return Response(render_waterfall_html(doc), mimetype='text/html')
+        return Response(render_waterfall(doc), mimetype='text/plain')
@@ -0,0 +1,93 @@
+"""
+Streaming storage of uploaded feedback files in GridFS.
+
+The request stream is copied into GridFS chunk by chunk, so an upload never has
+to be held in memory as a whole. The size limit, SHA-256 content hash and the
+header probe all happen on that same pass.
+"""
+import csv
+import hashlib
+import io
+import os
+
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 50))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Multipart boundaries and form fields on top of the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Four GridFS chunks (255 KiB each) per read
+UPLOAD_CHUNK_SIZE = 4 * 255 * 1024
+
+XLSX_MAGIC = b'PK\x03\x04'
+XLS_MAGIC = b'\xd0\xcf\x11\xe0'
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def probe_header(first_chunk, filename):
+    """Guess the file format from its first bytes and, for CSV, read the header row"""
+    if first_chunk.startswith(XLSX_MAGIC):
+        return {'format': 'xlsx', 'headers': None}
+    if first_chunk.startswith(XLS_MAGIC):
+        return {'format': 'xls', 'headers': None}
+
+    text = first_chunk.decode('utf-8-sig', errors='replace')
+    if '\n' not in text and '\r' not in text:
+        # Header row is longer than the first chunk; leave it to the parser
+        return {'format': 'csv', 'headers': None}
+    try:
+        headers = next(csv.reader(io.StringIO(text)))
+    except (csv.Error, StopIteration):
+        headers = None
+    return {'format': 'csv', 'headers': headers}
+
+
+def stream_to_gridfs(fs, stream, filename, content_type=None, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Copy a readable stream into GridFS without buffering it.
+
+    Raises UploadTooLarge (after removing the partial GridFS file) as soon as
+    more than max_bytes have been read. Returns the new file id together with
+    the size, SHA-256 hex digest and header probe of the content.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    probe = None
+
+    # The reversed filename backs indexed suffix lookups in /headers
+    grid_in = fs.new_file(filename=filename, content_type=content_type, reversed_filename=filename[::-1])
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+            if probe is None:
+                probe = probe_header(chunk, filename)
+            sha256.update(chunk)
+            grid_in.write(chunk)
+        grid_in.sha256 = sha256.hexdigest()
+        grid_in.close()
+    except BaseException:
+        grid_in.abort()
+        raise
+
+    return {
+        'file_id': grid_in._id,
+        'size': size,
+        'sha256': sha256.hexdigest(),
+        **(probe or {'format': None, 'headers': None})
+    }
+
+
+def hash_stream(stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """SHA-256 hex digest of a seekable stream, leaving it rewound for the next reader"""
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha256.update(chunk)
+    stream.seek(0)
+    return sha256.hexdigest()
@@ -0,0 +1,166 @@
+"""
+Vector rating charts drawn straight onto FPDF pages.
+
+This is the PDF counterpart of plot_ratings: grouped bars, axes, dashed
+gridlines, a legend and the category labels wrapped under each group, built
+from the same summary table with FPDF rect/line/text calls. No matplotlib and
+no embedded PNG, so each chart costs well under a millisecond and a few KB of
+PDF.
+"""
+import math
+
+# Same colours as the PNG charts: viridis for stakeholder charts, matplotlib's
+# default cycle for subject charts, in rating order 5..1
+STAKEHOLDER_COLORS = [(68, 1, 84), (59, 82, 139), (33, 145, 140), (94, 201, 98), (253, 231, 37)]
+SUBJECT_COLORS = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189)]
+
+PLOT_HEIGHT = 95
+Y_AXIS_WIDTH = 16
+LEGEND_WIDTH = 22
+# Category labels are wrapped to their group's width, in at most this many lines
+LABEL_MAX_LINES = 4
+LABEL_LINE_HEIGHT = 3
+
+
+def nice_axis_max(value, ticks=5):
+    """Round the largest count up to a 1/2/5 x 10^n step so gridlines land on round numbers"""
+    if value <= 0:
+        return 1, 1
+    raw_step = value / ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw_step)
+    step = max(1, int(step)) if value >= ticks else max(step, 1)
+    return int(math.ceil(value / step) * step), step
+
+
+def wrap_label(pdf, text, width, max_lines=LABEL_MAX_LINES):
+    """
+    Split text into lines no wider than width in the current font. Words too long
+    for a line are broken; past max_lines the last line ends in '...'.
+    """
+    def fits(line):
+        return pdf.get_string_width(line) <= width
+
+    lines = []
+    line = ''
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if fits(candidate):
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        line = ''
+        for char in word:
+            if line and not fits(line + char):
+                lines.append(line)
+                line = ''
+            line += char
+    if line:
+        lines.append(line)
+
+    if len(lines) > max_lines:
+        lines = lines[:max_lines]
+        last = lines[-1]
+        while last and not fits(last + '...'):
+            last = last[:-1]
+        lines[-1] = last.rstrip() + '...'
+    return lines
+
+
+def draw_rating_chart(pdf, score_df, report_type, report_name, feedback_type='stakeholder', text_fn=str):
+    """
+    Draw a grouped bar chart of rating counts on a new page of pdf.
+    text_fn makes labels safe for the PDF core fonts (sanitize_text in the report code).
+    """
+    ratings = [col for col in [5, 4, 3, 2, 1] if col in score_df.columns]
+    if score_df.empty or not ratings:
+        return
+    colors = STAKEHOLDER_COLORS if feedback_type == 'stakeholder' else SUBJECT_COLORS
+    bar_fill = 0.8 if feedback_type == 'stakeholder' else 0.4
+    categories = [str(label) for label in score_df['Category']]
+    counts = [[int(value) for value in score_df[rating]] for rating in ratings]
+
+    pdf.add_page()
+    left = pdf.l_margin
+    usable_width = pdf.w - pdf.l_margin - pdf.r_margin
+
+    # Title
+    pdf.set_font('Arial', 'B', 12)
+    pdf.multi_cell(0, 6, text_fn(f"{report_type} - {report_name}"), align='C')
+    pdf.ln(4)
+
+    plot_x = left + Y_AXIS_WIDTH
+    plot_y = pdf.get_y() + 4
+    plot_w = usable_width - Y_AXIS_WIDTH - LEGEND_WIDTH
+    plot_h = PLOT_HEIGHT
+    axis_max, step = nice_axis_max(max(max(row) for row in counts))
+
+    def y_for(value):
+        return plot_y + plot_h - plot_h * value / axis_max
+
+    # Gridlines and y tick labels
+    pdf.set_font('Arial', '', 7)
+    pdf.set_draw_color(190, 190, 190)
+    pdf.set_line_width(0.1)
+    tick = 0
+    while tick <= axis_max:
+        y = y_for(tick)
+        if tick:
+            pdf.dashed_line(plot_x, y, plot_x + plot_w, y, 1, 1)
+        label = str(int(tick)) if float(tick).is_integer() else f"{tick:g}"
+        pdf.text(plot_x - 1.5 - pdf.get_string_width(label), y + 1, label)
+        tick += step
+
+    # Y axis title, rotated along the axis
+    y_title = "Number of Responses" if feedback_type == 'stakeholder' else "No. of Responses"
+    pdf.set_font('Arial', '', 8)
+    title_x = left + 3
+    title_y = plot_y + (plot_h + pdf.get_string_width(y_title)) / 2
+    pdf.rotate(90, title_x, title_y)
+    pdf.text(title_x, title_y, y_title)
+    pdf.rotate(0)
+
+    # Bars
+    group_w = plot_w / len(categories)
+    bar_w = group_w * bar_fill / len(ratings)
+    for idx in range(len(categories)):
+        x = plot_x + idx * group_w + (group_w - bar_w * len(ratings)) / 2
+        for r, rating in enumerate(ratings):
+            value = counts[r][idx]
+            if value > 0:
+                pdf.set_fill_color(*colors[r])
+                pdf.rect(x + r * bar_w, y_for(value), bar_w, plot_y + plot_h - y_for(value), 'F')
+
+    # Axes
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_line_width(0.3)
+    pdf.line(plot_x, plot_y, plot_x, plot_y + plot_h)
+    pdf.line(plot_x, plot_y + plot_h, plot_x + plot_w, plot_y + plot_h)
+
+    # Category labels wrapped under each group, like the rotated tick labels of the PNG charts
+    pdf.set_font('Arial', '', 7)
+    label_lines = [wrap_label(pdf, text_fn(label), group_w - 1) for label in categories]
+    for idx, lines in enumerate(label_lines):
+        center = plot_x + idx * group_w + group_w / 2
+        for line_no, line in enumerate(lines):
+            pdf.text(center - pdf.get_string_width(line) / 2, plot_y + plot_h + 4 + line_no * LABEL_LINE_HEIGHT, line)
+    labels_h = max(len(lines) for lines in label_lines) * LABEL_LINE_HEIGHT
+    x_title = "Categories" if feedback_type == 'stakeholder' else str(report_type)
+    pdf.set_font('Arial', '', 8)
+    pdf.text(plot_x + (plot_w - pdf.get_string_width(text_fn(x_title))) / 2, plot_y + plot_h + 6 + labels_h, text_fn(x_title))
+
+    # Legend
+    legend_x = plot_x + plot_w + 4
+    pdf.set_font('Arial', 'B', 8)
+    pdf.text(legend_x, plot_y + 3, "Rating")
+    pdf.set_font('Arial', '', 8)
+    for r, rating in enumerate(ratings):
+        y = plot_y + 6 + r * 5
+        pdf.set_fill_color(*colors[r])
+        pdf.rect(legend_x, y, 3, 3, 'F')
+        pdf.text(legend_x + 5, y + 2.6, str(rating))
+
+    pdf.set_xy(left, plot_y + plot_h + 10 + labels_h)
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_line_width(0.2)
@@ -0,0 +1,110 @@
+"""
+Warm-up for freshly started rendering processes.
+
+The first chart a process draws pays for the matplotlib font cache, font
+lookups at the large tick sizes used by the charts, pandas' plotting imports
+and FPDF's core font metrics. warm_up_rendering() draws one synthetic chart
+and PDF page up front so that cost lands before the first request: gunicorn
+calls it from post_fork, and it can be passed as the initializer of a
+process pool that renders charts.
+
+The font cache can also be seeded from a file built during deployment
+(MPL_FONT_CACHE), so workers never scan the system fonts themselves:
+
+    python warmup.py --build-font-cache build/
+    MPL_FONT_CACHE=build/fontlist-v3.9.0.json   # the path printed above
+
+The file keeps matplotlib's versioned name, so a cache built for another
+matplotlib version is simply ignored and rebuilt.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+WARMUP_ENABLED = os.environ.get('WARMUP_WORKERS', '1') == '1'
+MPL_FONT_CACHE = os.environ.get('MPL_FONT_CACHE')
+
+
+def seed_font_cache(source=MPL_FONT_CACHE):
+    """Copy a prebuilt matplotlib font list into the cache dir, before font_manager is imported"""
+    if not source or not os.path.exists(source):
+        return False
+    if 'matplotlib.font_manager' in sys.modules:
+        # Too late, the font list has already been loaded or built
+        return False
+    import matplotlib
+    target = os.path.join(matplotlib.get_cachedir(), os.path.basename(source))
+    if not os.path.exists(target):
+        shutil.copyfile(source, target)
+    return True
+
+
+def build_font_cache(directory):
+    """Build matplotlib's font list and copy it into directory; returns the path to use as MPL_FONT_CACHE"""
+    import matplotlib
+    from matplotlib import font_manager
+    font_manager.findfont('DejaVu Sans')
+    cache_file = os.path.join(matplotlib.get_cachedir(), f"fontlist-v{font_manager.FontManager.__version__}.json")
+    os.makedirs(directory, exist_ok=True)
+    destination = os.path.join(directory, os.path.basename(cache_file))
+    shutil.copyfile(cache_file, destination)
+    return destination
+
+
+def _sample_summary():
+    import pandas as pd
+    return pd.DataFrame({
+        'Category': ['Teaching quality of the department', 'Library and lab resources'],
+        5: [4, 2], 4: [3, 5], 3: [1, 2], 2: [1, 0], 1: [0, 1],
+        'Total': [9, 10], 'Average': [4.11, 3.7]
+    })
+
+
+def warm_up_rendering():
+    """Draw a throwaway chart and PDF page in this process; nothing is stored"""
+    if not WARMUP_ENABLED:
+        return
+    started = time.time()
+    try:
+        seed_font_cache()
+        from metrics import unrecorded
+        with unrecorded():
+            _render_sample()
+        print(f"🔥 Rendering warm-up done in {time.time() - started:.2f}s (pid {os.getpid()})")
+    except Exception as e:
+        # A failed warm-up only costs the first request some latency
+        print(f"⚠️ Rendering warm-up failed: {e}")
+
+
+def _render_sample():
+    """The throwaway renders; kept out of the stage metrics, which should only describe real requests"""
+    from feedback_processor import StakeholderPDF, render_ratings_png
+
+    summary = _sample_summary()
+    for feedback_type in ('stakeholder', 'subject'):
+        png_bytes = render_ratings_png(summary, 'Warm-up', 'Sample', feedback_type, 'print')
+    render_ratings_png(summary, 'Warm-up', 'Sample', 'stakeholder', 'preview')
+
+    pdf = StakeholderPDF()
+    pdf.add_page()
+    pdf.section_title("Warm-up Feedback Summary")
+    pdf.table(summary)
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+        tmp.write(png_bytes)
+        tmp_path = tmp.name
+    try:
+        pdf.add_page()
+        pdf.image(tmp_path, x=1, y=5, w=pdf.w - 2)
+    finally:
+        os.unlink(tmp_path)
+    pdf.insert_vector_chart(summary, 'Warm-up', 'Sample')
+    pdf.output(dest='S')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--build-font-cache':
+        print(build_font_cache(sys.argv[2]))
+    else:
+        print("Usage: python warmup.py --build-font-cache <directory>")